@@ -2,12 +2,17 @@ import requests
 import time
 import pandas as pd
 import os
+import sys
 
 print("This file will only run if you uncomment out the code at the bottom!")
 
 # Determine the directory of the current .py file
 script_dir = os.path.dirname(os.path.realpath(__file__))
 
+# Hand-off files are written with the same helper Part 3 uses to read them
+sys.path.append(os.path.join(os.path.dirname(script_dir), "part3"))
+from data_processing import write_handoff
+
 def reconstruct_abstract(inverted_index):
     """
     Reconstructs the abstract text from an inverted index.
@@ -201,7 +206,8 @@ def main():
     # Build the output file path in the same directory
     output_file = os.path.join(script_dir, "openalex_researcher_datasets_matches.csv")
 
-    output_df.to_csv(output_file, index=False)
+    # Also saves a typed Parquet copy for Part 3: authors as list<string>, text codes as categories.
+    write_handoff(output_df, output_file)
     print(f"Saved {len(output_df)} matching records to {output_file}")
 
 # Run the file
@@ -4,11 +4,32 @@
 import numpy as np
 import pandas as pd
 import os
+import re
+import zlib
+import hashlib
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from fuzzywuzzy import fuzz
 
 # Determine the directory of the current .py file
 script_dir = os.path.dirname(os.path.realpath(__file__))
 
+# Prime for the MinHash hash functions (larger than any crc32 value)
+MINHASH_PRIME = np.uint64(4294967311)
+
+# Columns saved as native list<string> and categorical columns in Parquet hand-off files
+HANDOFF_LIST_COLUMNS = ["authors"]
+HANDOFF_CATEGORY_COLUMNS = ["researcher", "location", "type_crossref", "source_display_name"]
+# Parquet metadata key holding the content hash of the csv a hand-off copy was written from
+HANDOFF_HASH_KEY = b"csv_sha256"
+
+# Columns saved in the match ledger for each research output
+DECISION_COLUMNS = ["unique", "best_match_idx", "best_match_title", "best_match_score"]
+LEDGER_COLUMNS = ["output_key", "row_hash"] + DECISION_COLUMNS
+
 
 # Define function to clean 2024 research output data set
 def clean_2024_data(outputs_org):
@@ -87,7 +108,8 @@ def clean_retreived_data(outputs):
         # Convert publication_date column to datetime
         outputs["publication_date"] = pd.to_datetime(outputs["publication_date"])
         # Split the authors and save it in a set
-        outputs["authors"] = outputs["authors"].apply(lambda x: {item.strip() for item in x.split(";")})
+        # (Authors read from Parquet hand-off files are already a list)
+        outputs["authors"] = outputs["authors"].apply(lambda x: set(split_handoff_list(x)))
         # Strip researcher and title column
         outputs["researcher"] = outputs["researcher"].str.strip()
         outputs["title"] = outputs["title"].str.strip()
@@ -133,7 +155,7 @@ def test_clean_retreived_data():
     print("All test cases passed! (clean_retreived_data)")
 
 # Define function to identify unique records just by year
-def find_unique_records_year(outputs_org, outputs):
+def find_unique_records_year(outputs_org, outputs, year_tolerance=0):
     """
     Identify records that is outside the year range of 2024 research
     output dataset as unique record, make it in API result df
@@ -141,6 +163,8 @@ def find_unique_records_year(outputs_org, outputs):
     Parameters:
     - outputs_org_clean: clean 2024 research output dataframe
     - outputs_clean: clean API result research output dataframe
+    - year_tolerance: number of years a record can be away from the
+    closest 2024 dataset year and still be checked by fuzzy matching
 
     Return:
     Modified clean API result research output dataframe with year outside 
@@ -149,7 +173,17 @@ def find_unique_records_year(outputs_org, outputs):
     try:
         # Filter unique outputs by year
         # Output published outside the range of 2024 dataset is definitely unique output
-        outputs.loc[~outputs["year"].isin(outputs_org.Year.unique()), "unique"] = True
+        if year_tolerance == 0:
+            outputs.loc[~outputs["year"].isin(outputs_org.Year.unique()), "unique"] = True
+        else:
+            # Distance from each output year to the closest 2024 dataset year
+            org_years = np.sort(outputs_org.Year.unique()).astype(float)
+            years = outputs["year"].to_numpy(dtype=float)
+            if len(org_years) == 0:
+                outputs["unique"] = True
+                return outputs
+            distance = np.abs(years[:, None] - org_years[None, :]).min(axis=1)
+            outputs.loc[~(distance <= year_tolerance), "unique"] = True
 
         # Return the result
         return outputs
@@ -215,6 +249,67 @@ def test_find_unique_records_year_without_matches():
 
     print("All test cases passed! (test_find_unique_records_year_without_matches)")
 
+# Define function to score one API result output against one 2024 research output
+def score_record_pair(row, org_title, org_PI, threshold=90):
+    """
+    Compare one API result research output with one 2024 research output
+    Two outputs share the same PI if the PI is the researcher or one of the authors
+    (Exact matching or fuzzy matching with a similarity score of threshold or above)
+
+    Parameters:
+    - row: API result research output (needs title, researcher and authors)
+    - org_title: title of the 2024 research output
+    - org_PI: PI of the 2024 research output
+    - threshold: Minimum similarity score to consider PI as the same
+
+    Return:
+    Title similarity score if two outputs share the same PI, otherwise None
+    """
+    # Check if PI is in authors/researchers (or similarity score is above threshold if not)
+    if (org_PI in row["authors"]) or (org_PI == row["researcher"]):
+        # Exact match if we can find it in authors or researcher directly
+        PI_flag = True
+    else:
+        # If there is no exact match, we do fuzzy matching on names
+        # Keep track of the author best match score
+        best_PI_score = fuzz.token_sort_ratio(row["researcher"].lower(), org_PI.lower())
+        # Loop through the authors list to get the best similarity score
+        for author in row["authors"]:
+            # Calculate author similarity score
+            score_author = fuzz.token_sort_ratio(author.lower(), str(org_PI).lower())
+            # Replace the best_PI score if better
+            if score_author > best_PI_score:
+                best_PI_score = score_author
+        # If the best score is above threshold, we consider it as the same PI
+        PI_flag = best_PI_score >= threshold
+
+    # Check if two outputs has the same PI, only score the titles if True
+    if not PI_flag:
+        return None
+    return fuzz.token_sort_ratio(str(row["title"]).lower(), str(org_title).lower())
+
+# Define function to put the best match of each record into columns
+def build_match_frame(index, matched, match_idx, match_title, match_score):
+    """
+    Build the matching result columns aligned to the API result research outputs
+
+    Parameters:
+    - index: index of API result research output df
+    - matched: boolean array, whether each record has a best match above the threshold
+    - match_idx: array of best match index in 2024 research output dataset
+    - match_title: array of best match title
+    - match_score: array of best match score
+
+    Return:
+    Dataframe with best_match_idx, best_match_title and best_match_score
+    (missing for unique records)
+    """
+    return pd.DataFrame({
+        "best_match_idx": pd.arrays.IntegerArray(match_idx.astype(np.int64), ~matched),
+        "best_match_title": np.where(matched, match_title, None),
+        "best_match_score": pd.arrays.IntegerArray(match_score.astype(np.int64), ~matched)},
+        index=index)
+
 # Define a function to identify unique records using fuzzy matching
 def find_unique_records_fuzz(outputs_org, outputs, threshold=90):
     """
@@ -232,19 +327,19 @@ def find_unique_records_fuzz(outputs_org, outputs, threshold=90):
     - threshold: Minimum similarity score to consider as the same
 
     Returns:
-    - set of unique records indices in API result research outputs
-    - dictionary of best matches results if the API record is not unique
-    - key: index in API result research output df
-    - value: tuple (best match index,best_match_title, best_match_Score)
-    in 2024 research output dataset
+    Dataframe aligned to outputs.index with the best match of each record
+    in 2024 research output dataset (best_match_idx, best_match_title,
+    best_match_score), all missing if the API record is unique
     """
     try:
-        # Keep track of index of unique records and best matches for non-unique records
-        unique_indices = set()
-        best_matches = {}
+        # Keep track of the best match of each record in arrays (by position)
+        matched = np.zeros(len(outputs), dtype=bool)
+        match_idx = np.zeros(len(outputs), dtype=np.int64)
+        match_title = np.full(len(outputs), None, dtype=object)
+        match_score = np.zeros(len(outputs), dtype=np.int64)
 
         # Loop through all records in outputs to find the closest fuzzy match records
-        for idx, row in outputs.iterrows():
+        for position, (idx, row) in enumerate(outputs.iterrows()):
             # Filter the records to keep the records with the same year
             outputs_org_filtered = outputs_org[outputs_org["Year"] == row["year"]]
 
@@ -255,32 +350,9 @@ def find_unique_records_fuzz(outputs_org, outputs, threshold=90):
 
             # Loop through all records in original 2024 dataset to find the best match
             for idx2, row2 in outputs_org_filtered.iterrows():
-                # Check if PI is in authors/researchers (or similarity score is above threshold if not)
-                if (row2["PI"] in row["authors"]) or (row2["PI"] == row["researcher"]):
-                    # Exact match if we can find it in authors or researcher directly
-                    PI_flag = True
-                else:
-                    # If there is no exact match, we do fuzzy matching on names
-                    # Keep track of the author best match score
-                    best_PI_score = fuzz.token_sort_ratio(row["researcher"].lower(), row2["PI"].lower())
-                    # Loop through the authors list to get the best similarity score
-                    for author in row["authors"]:
-                        # Calculate author similarity score
-                        score_author = fuzz.token_sort_ratio(author.lower(), str(row2["PI"]).lower())
-                        # Replace the best_PI score if better
-                        if score_author > best_PI_score:
-                            best_PI_score = score_author
-                    # If the best score is above threshold, we consider it as the same PI
-                    # Skip this record if PI are considered the same
-                    if best_PI_score < threshold:
-                        PI_flag = False
-                    else:
-                        PI_flag = True
-
-                # Check if two outputs has the same PI, only proceed if True
-                if PI_flag:
-                    # Get similarity score
-                    score = fuzz.token_sort_ratio(str(row["title"]).lower(), str(row2["Title"]).lower())
+                # Get title similarity score, only if two outputs has the same PI
+                score = score_record_pair(row, row2["Title"], row2["PI"], threshold)
+                if score is not None:
                     # Replace the best match idx, title, score if this is better
                     if score > best_match_score:
                         best_match_idx = idx2
@@ -288,14 +360,15 @@ def find_unique_records_fuzz(outputs_org, outputs, threshold=90):
                         best_match_score = score
 
             # If best match is above the threshold, save the best match result
-            # Otherwise add idx to unique_indices set
+            # Otherwise the record is unique and keeps missing values
             if best_match_score >= threshold:
-                best_matches[idx] = (best_match_idx, best_match_title, best_match_score)
-            else:
-                unique_indices.add(idx)
+                matched[position] = True
+                match_idx[position] = best_match_idx
+                match_title[position] = best_match_title
+                match_score[position] = best_match_score
 
-        # Return both unique_indices and best_matches
-        return unique_indices, best_matches
+        # Return the best matches as columns aligned to outputs.index
+        return build_match_frame(outputs.index, matched, match_idx, match_title, match_score)
     except Exception as e:
         print(f"Error in find_unique_records_fuzz: {e}")
         raise
@@ -321,7 +394,10 @@ def test_find_unique_records_fuzz_with_matches():
     expected_matches = {0: (0, "Paper is important", 90)}
 
     # Get the result for test
-    unique_indices, best_matches = find_unique_records_fuzz(outputs_org, outputs)
+    matches = find_unique_records_fuzz(outputs_org, outputs)
+    # Split the result into unique indices and best matches
+    unique_indices = set(matches.index[matches["best_match_idx"].isna()])
+    best_matches = {idx: tuple(match) for idx, match in matches.dropna().iterrows()}
 
     # Check if results are the same
     assert unique_indices == expected_unique, f"Expected unique indices {expected_unique}, got {unique_indices}"
@@ -359,7 +435,10 @@ def test_find_unique_records_fuzz_all_unique():
     expected_matches = {}
 
     # Call the function to get the result
-    unique_indices, best_matches = find_unique_records_fuzz(outputs_org, outputs)
+    matches = find_unique_records_fuzz(outputs_org, outputs)
+    # Split the result into unique indices and best matches
+    unique_indices = set(matches.index[matches["best_match_idx"].isna()])
+    best_matches = {idx: tuple(match) for idx, match in matches.dropna().iterrows()}
 
     # Check if the results are the same
     assert unique_indices == expected_unique, f"Expected all indices to be unique {expected_unique}, got {unique_indices}"
@@ -367,45 +446,646 @@ def test_find_unique_records_fuzz_all_unique():
 
     print("All test cases passed! (test_find_unique_records_fuzz_all_unique)")
 
-# Define function to complete Part 3 all steps
-def data_pipeline(API):
+# Define function to get the character shingles of a title
+def get_title_shingles(title, k=3):
     """
-    Define function to complete everything for API/ webscrapping data
-    
+    Get the set of character k-shingles of a normalized title
+    Words are sorted first, the same way token sort ratio compares titles
+
     Parameters:
-    - data_file_name: file name for API or webscrapping data
-    - API: whether the data is API data
+    - title: title of the research output
+    - k: number of characters in each shingle
+
+    Return:
+    Set of shingles of the title
     """
-    # Print messages for information
-    if API:
-        print("Processing API data:")
+    words = sorted(re.sub(r"[^a-z0-9]+", " ", str(title).lower()).split())
+    text = " ".join(words)
+    if len(text) <= k:
+        return {text}
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+# Define function to get the MinHash signatures of titles
+def get_minhash_signatures(titles, num_perm=128, seed=42):
+    """
+    Get the MinHash signature of each title from its shingles
+
+    Parameters:
+    - titles: list of titles
+    - num_perm: number of hash functions in each signature
+    - seed: random seed for the hash functions
+
+    Return:
+    Array of signatures with one row per title
+    """
+    # Hash functions (a * x + b) mod prime, with x the crc32 value of a shingle
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2**31, size=num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(titles), num_perm), dtype=np.uint64)
+    for i, title in enumerate(titles):
+        shingle_hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in get_title_shingles(title)),
+                                     dtype=np.uint64)
+        signatures[i] = ((np.outer(a, shingle_hashes) + b[:, None]) % MINHASH_PRIME).min(axis=1)
+    return signatures
+
+# Define function to build the LSH index of the 2024 research output titles
+def build_title_lsh_index(titles, num_perm=128, bands=32):
+    """
+    Put each 2024 research output title into one bucket per band of its MinHash signature
+    Titles that share a bucket in any band are candidate matches
+
+    Parameters:
+    - titles: list of 2024 research output titles
+    - num_perm: number of hash functions in each signature
+    - bands: number of bands (num_perm must be divisible by bands)
+
+    Return:
+    List with one dictionary per band (bucket key -> list of positions in titles)
+    """
+    rows = num_perm // bands
+    signatures = get_minhash_signatures(titles, num_perm)
+    index = [defaultdict(list) for _ in range(bands)]
+    for position, signature in enumerate(signatures):
+        for band in range(bands):
+            index[band][signature[band * rows:(band + 1) * rows].tobytes()].append(position)
+    return index
+
+# Define a function to identify unique records using LSH candidates and fuzzy matching
+def find_unique_records_lsh(outputs_org, outputs, threshold=90, year_tolerance=0,
+                            num_perm=128, bands=32):
+    """
+    Find unique records in the API result research outputs that does not exist in 2024 research output dataset
+    Same rules as find_unique_records_fuzz, but only the 2024 outputs that share
+    an LSH bucket of title shingles with the record are scored, and the years
+    of two outputs can differ by up to year_tolerance
+
+    Parameters:
+    - outputs_org: clean dataFrame of 2024 dataset
+    - outputs: clean dataFrame of API retrieved research outputs
+    - threshold: Minimum similarity score to consider as the same
+    - year_tolerance: Maximum difference between the years of two outputs
+    - num_perm: number of hash functions in each MinHash signature
+    - bands: number of LSH bands
+
+    Returns:
+    Dataframe aligned to outputs.index with the best match of each record
+    in 2024 research output dataset (best_match_idx, best_match_title,
+    best_match_score), all missing if the API record is unique
+    """
+    try:
+        # Keep track of the best match of each record in arrays (by position)
+        matched = np.zeros(len(outputs), dtype=bool)
+        match_idx = np.zeros(len(outputs), dtype=np.int64)
+        match_title = np.full(len(outputs), None, dtype=object)
+        match_score = np.zeros(len(outputs), dtype=np.int64)
+
+        # Build the LSH index over 2024 research output titles
+        org_index = outputs_org.index.to_numpy()
+        org_titles = outputs_org["Title"].tolist()
+        org_PIs = outputs_org["PI"].tolist()
+        org_years = outputs_org["Year"].to_numpy(dtype=float)
+        lsh_index = build_title_lsh_index(org_titles, num_perm, bands)
+        rows = num_perm // bands
+
+        # Get the signatures of all API result titles at once
+        signatures = get_minhash_signatures(outputs["title"].tolist(), num_perm)
+
+        # Loop through all records in outputs to find the closest fuzzy match records
+        for position, (signature, (idx, row)) in enumerate(zip(signatures, outputs.iterrows())):
+            # Collect the 2024 outputs sharing a bucket with this title in any band
+            candidates = set()
+            for band in range(bands):
+                candidates.update(lsh_index[band].get(signature[band * rows:(band + 1) * rows].tobytes(), ()))
+
+            # Keep track of the best macthed index, title, and similarity score
+            best_match_idx = -1
+            best_match_title = ""
+            best_match_score = 0.0
+
+            # Only score the candidates within the year tolerance (in the original order)
+            for org_position in sorted(candidates):
+                if not abs(org_years[org_position] - row["year"]) <= year_tolerance:
+                    continue
+                score = score_record_pair(row, org_titles[org_position], org_PIs[org_position], threshold)
+                # Replace the best match idx, title, score if this is better
+                if score is not None and score > best_match_score:
+                    best_match_idx = org_index[org_position]
+                    best_match_title = org_titles[org_position]
+                    best_match_score = score
+
+            # If best match is above the threshold, save the best match result
+            # Otherwise the record is unique and keeps missing values
+            if best_match_score >= threshold:
+                matched[position] = True
+                match_idx[position] = best_match_idx
+                match_title[position] = best_match_title
+                match_score[position] = best_match_score
+
+        # Return the best matches as columns aligned to outputs.index
+        return build_match_frame(outputs.index, matched, match_idx, match_title, match_score)
+    except Exception as e:
+        print(f"Error in find_unique_records_lsh: {e}")
+        raise
+
+def test_find_unique_records_lsh():
+    """
+    Test the function find_unique_records_lsh with a year difference of one
+    """
+    # Create test dataframes
+    outputs_org = pd.DataFrame({
+        "Title": ["Paper is important", "Exam makes us stronger", "Homework values efforts"],
+        "PI": ["Joe H. Biden ", "Louis Harper", "Cameron Spiker"],
+        "Year": [2023, 2022, 2018]})
+
+    outputs = pd.DataFrame({
+        "title": ["A paper is important", "Exam makes us stronger", "Homework values efforts"],
+        "researcher": ["Joe Biden", "Louis Harper", "Cameron Spiker"],
+        "authors": [{"Linh Ngygen", "Alice Zhao"}, {"Travis Levitt"}, {"Greyson Hampon"}],
+        "year": [2023, 2023, 2021]})
+
+    # Get the result for test
+    matches = find_unique_records_lsh(outputs_org, outputs, year_tolerance=1)
+    # Split the result into unique indices and best matches
+    unique_indices = set(matches.index[matches["best_match_idx"].isna()])
+    best_matches = {idx: tuple(match) for idx, match in matches.dropna().iterrows()}
+
+    # Record 1 is one year away from its match, record 2 is three years away
+    assert unique_indices == {2}, f"Expected unique indices {{2}}, got {unique_indices}"
+    assert set(best_matches.keys()) == {0, 1}, f"Expected match keys {{0, 1}}, got {best_matches.keys()}"
+    assert best_matches[0][:2] == (0, "Paper is important"), f"Unexpected match {best_matches[0]}"
+    assert best_matches[1] == (1, "Exam makes us stronger", 100), f"Unexpected match {best_matches[1]}"
+
+    # Without year tolerance, record 1 is unique again
+    matches = find_unique_records_lsh(outputs_org, outputs, year_tolerance=0)
+    unique_indices = set(matches.index[matches["best_match_idx"].isna()])
+    assert unique_indices == {1, 2}, f"Expected unique indices {{1, 2}}, got {unique_indices}"
+
+    print("All test cases passed! (test_find_unique_records_lsh)")
+
+# Define function to get a stable key for each research output
+def get_output_keys(outputs):
+    """
+    Get a stable key for each research output
+    Use the DOI if the output has one, otherwise use normalized title and year
+
+    Parameters:
+    - outputs: clean API result research output dataframe
+
+    Return:
+    Series of output keys aligned to outputs.index
+    """
+    try:
+        # Normalize DOI by removing the resolver prefix
+        doi = (outputs["doi"].fillna("").astype(str).str.strip().str.lower()
+               .str.replace(r"^https?://(dx\.)?doi\.org/", "", regex=True))
+        # Normalize title by keeping lower case letters and digits only
+        title = (outputs["title"].fillna("").astype(str).str.lower()
+                 .str.replace(r"[^a-z0-9]+", " ", regex=True).str.strip())
+        title_key = "title:" + title + "|" + outputs["year"].astype(str)
+
+        # Use DOI key when DOI is available
+        return ("doi:" + doi).where(doi != "", title_key)
+    except Exception as e:
+        print(f"Error in get_output_keys: {e}")
+        raise
+
+# Define function to get a fingerprint of the fields used for matching
+def get_row_hashes(outputs):
+    """
+    Get a hash of the fields used for matching (title, year, researcher, authors)
+    so that changed research outputs can be detected
+
+    Parameters:
+    - outputs: clean API result research output dataframe
+
+    Return:
+    Series of row hashes (as strings) aligned to outputs.index
+    """
+    try:
+        match_fields = pd.DataFrame({
+            "title": outputs["title"].astype(str),
+            "year": outputs["year"].astype(str),
+            "researcher": outputs["researcher"].astype(str),
+            "authors": outputs["authors"].apply(lambda x: "; ".join(sorted(x)))})
+        return pd.util.hash_pandas_object(match_fields, index=False).astype(str)
+    except Exception as e:
+        print(f"Error in get_row_hashes: {e}")
+        raise
+
+# Define function to get the version of the 2024 research output dataset
+def get_reference_version(outputs_org):
+    """
+    Get the version of the clean 2024 research output dataset from its content
+
+    Parameters:
+    - outputs_org: clean 2024 research output dataframe
+
+    Return:
+    Version string that changes whenever the 2024 dataset changes
+    """
+    row_hashes = pd.util.hash_pandas_object(outputs_org, index=True).values
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()[:16]
+
+# Define function to read in the match ledger
+def load_match_ledger(ledger_file_name, reference_version):
+    """
+    Read in the decisions saved by previous runs
+
+    Parameters:
+    - ledger_file_name: file name of the match ledger
+    - reference_version: version of the current 2024 research output dataset
+
+    Return:
+    Ledger dataframe indexed by (output_key, row_hash)
+    Empty if there is no ledger (or ledger_file_name is None) or it was built
+    for another 2024 dataset version
+    """
+    empty_ledger = pd.DataFrame(columns=LEDGER_COLUMNS).set_index(["output_key", "row_hash"])
+    if ledger_file_name is None or not os.path.exists(ledger_file_name):
+        return empty_ledger
+
+    try:
+        ledger = pd.read_csv(ledger_file_name, dtype={"output_key": str, "row_hash": str,
+                                                      "reference_version": str,
+                                                      "best_match_idx": "Int64",
+                                                      "best_match_score": "Int64"})
+    except Exception as e:
+        print(f"An error occurred while reading the match ledger: {str(e)}")
+        return empty_ledger
+
+    # Full recomputation if the 2024 dataset changed
+    if ledger.empty or (ledger["reference_version"] != reference_version).any():
+        print("2024 research output dataset or matching settings changed, recomputing all matches")
+        return empty_ledger
+
+    return ledger[LEDGER_COLUMNS].set_index(["output_key", "row_hash"])
+
+# Define function to save the match ledger
+def save_match_ledger(outputs, ledger_file_name, reference_version):
+    """
+    Save the decisions of this run so that later runs only score new or changed records
+
+    Parameters:
+    - outputs: API result research output dataframe with matching results
+    - ledger_file_name: file name of the match ledger
+    - reference_version: version of the current 2024 research output dataset
+    """
+    ledger = outputs[LEDGER_COLUMNS].drop_duplicates(subset=["output_key", "row_hash"]).copy()
+    ledger["reference_version"] = reference_version
+    ledger.to_csv(ledger_file_name, index=False)
+
+# Define test function for get_output_keys
+def test_get_output_keys():
+    """
+    Test the function get_output_keys()
+    """
+    # Create test dataframe
+    test_data = pd.DataFrame({
+        "title": ["Paper 1", " The Paper: 2 ", "Paper 3"],
+        "doi": ["https://doi.org/10.1/ABC", None, ""],
+        "year": [2015, 2019, 2016]})
+
+    # Create expected series
+    test_expected = pd.Series(["doi:10.1/abc", "title:the paper 2|2019", "title:paper 3|2016"])
+
+    # Get the result for test data
+    test_result = get_output_keys(test_data)
+
+    # Test if the results are the same
+    assert test_result.equals(test_expected), "Series doesn't match expected values"
+
+    print("All test cases passed! (test_get_output_keys)")
+
+# Define function to match research outputs with the help of the match ledger
+def match_research_outputs(outputs_org, outputs, ledger_file_name, use_ledger=True,
+                           match_method="fuzz", year_tolerance=0):
+    """
+    Match clean research outputs against the 2024 dataset
+    Only new or changed research outputs are scored, decisions for the others are
+    read from the match ledger, and the decisions of this run are saved in the ledger
+
+    Parameters:
+    - outputs_org: clean 2024 research output dataframe
+    - outputs: clean API result research output dataframe
+    - ledger_file_name: file name of the match ledger
+    - use_ledger: whether to reuse the match ledger (False recomputes everything)
+    - match_method: "lsh" or "fuzz" (see data_pipeline)
+    - year_tolerance: maximum year difference between two matched outputs (lsh only)
+
+    Return:
+    Research output dataframe with output_key, row_hash and the decision columns
+    (unique, best_match_idx, best_match_title, best_match_score),
+    and the number of research outputs reused from the ledger
+    """
+    # Get the stable key and the fingerprint of the matching fields for each output
+    # Decisions depend on the 2024 dataset version and on the matching settings
+    if match_method != "lsh":
+        year_tolerance = 0
+    reference_version = f"{get_reference_version(outputs_org)}-{match_method}-{year_tolerance}"
+    outputs["output_key"] = get_output_keys(outputs)
+    outputs["row_hash"] = get_row_hashes(outputs)
+
+    # Find the research outputs already matched by previous runs (unchanged since then)
+    ledger = load_match_ledger(ledger_file_name if use_ledger else None, reference_version)
+    seen = outputs.set_index(["output_key", "row_hash"]).index.isin(ledger.index)
+    print(f"{(~seen).sum()} new or changed research outputs to match, {seen.sum()} reused from the match ledger")
+
+    # Only score the new or changed research outputs
+    # Identify the unique records only by year, they do not need fuzzy matching
+    new_outputs = find_unique_records_year(outputs_org, outputs[~seen].copy(), year_tolerance)
+    candidates = new_outputs[~new_outputs["unique"]]
+
+    # Identify the unique records using fuzzy matching
+    if match_method == "lsh":
+        matches = find_unique_records_lsh(outputs_org, candidates, year_tolerance=year_tolerance)
     else:
-        print("Processing webscraping data:")
+        matches = find_unique_records_fuzz(outputs_org, candidates)
+
+    # Records without a best match (by year or by fuzzy matching) are unique
+    matches = matches.reindex(new_outputs.index)
+    matches["unique"] = matches["best_match_idx"].isna()
+
+    # Add the previous decisions of research outputs in the ledger
+    if seen.any():
+        previous = ledger.reindex(pd.MultiIndex.from_frame(outputs.loc[seen, ["output_key", "row_hash"]]))
+        previous.index = outputs.index[seen]
+        matches = pd.concat([previous, matches])
+
+    # Save the matching information (unique, best match idx, title, score) with one join
+    outputs = outputs.drop(columns="unique").join(matches[DECISION_COLUMNS])
 
+    # Save the decisions of this run in the match ledger
+    save_match_ledger(outputs, ledger_file_name, reference_version)
+    return outputs, int(seen.sum())
 
+# Define test function for match_research_outputs with a match ledger
+def test_match_research_outputs_ledger():
+    """
+    Test that match_research_outputs reuses the match ledger for unchanged outputs,
+    rematches changed outputs and recomputes everything for a new 2024 dataset
+    """
+    # Create test dataframes
+    outputs_org = pd.DataFrame({
+        "Title": ["Paper is important", "Exam makes us stronger"],
+        "PI": ["Joe Biden", "Louis Harper"],
+        "Year": [2023, 2022]})
+    outputs = pd.DataFrame({
+        "title": ["Paper is important", "Exam makes us stronger", "Homework values efforts"],
+        "doi": ["10.1/a", None, None],
+        "researcher": ["Joe Biden", "Louis Harper", "Cameron Spiker"],
+        "authors": [{"Alice Zhao"}, {"Travis Levitt"}, {"Greyson Hampon"}],
+        "year": [2023, 2022, 2022],
+        "unique": [False, False, False]})
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger_file_name = os.path.join(tmp_dir, "match_ledger.csv")
+
+        # First run: everything is matched and saved in the ledger
+        result, reused = match_research_outputs(outputs_org, outputs.copy(), ledger_file_name)
+        assert reused == 0, f"Expected nothing reused, got {reused}"
+        assert result["unique"].tolist() == [False, False, True], f"Unexpected decisions {result['unique'].tolist()}"
+        assert os.path.exists(ledger_file_name), "Match ledger was not saved"
+
+        # Second run: decisions come from the ledger (mark one so reuse is visible)
+        ledger = pd.read_csv(ledger_file_name)
+        ledger.loc[0, "best_match_score"] = 1
+        ledger.to_csv(ledger_file_name, index=False)
+        result, reused = match_research_outputs(outputs_org, outputs.copy(), ledger_file_name)
+        assert reused == 3, f"Expected 3 reused, got {reused}"
+        assert result.loc[0, "best_match_score"] == 1, "Decision was not read from the ledger"
+
+        # Changed title and researcher: only that output is matched again
+        changed = outputs.copy()
+        changed.loc[2, ["title", "researcher"]] = ["Exam makes us stronger", "Louis Harper"]
+        result, reused = match_research_outputs(outputs_org, changed, ledger_file_name)
+        assert reused == 2, f"Expected 2 reused, got {reused}"
+        assert result.loc[2, "best_match_idx"] == 1, f"Changed output was not rematched: {result.loc[2].tolist()}"
+
+        # New 2024 dataset version: the ledger is not used
+        new_org = pd.concat([outputs_org, pd.DataFrame({"Title": ["Homework values efforts"],
+                                                        "PI": ["Cameron Spiker"], "Year": [2022]})],
+                            ignore_index=True)
+        result, reused = match_research_outputs(new_org, outputs.copy(), ledger_file_name)
+        assert reused == 0, f"Expected nothing reused, got {reused}"
+        assert result["unique"].tolist() == [False, False, False], f"Unexpected decisions {result['unique'].tolist()}"
+
+    print("All test cases passed! (test_match_research_outputs_ledger)")
+
+# Define function to turn one hand-off list cell into a list
+def split_handoff_list(value):
+    """
+    Turn one list cell of a hand-off file into a sorted list of strings
+    Shared by all hand-off writers and readers so they split the same way
+
+    Parameters:
+    - value: "; " separated string (csv), list, set or tuple, or missing (NaN)
+
+    Return:
+    Sorted list of the stripped non-empty items (empty for missing values)
+    """
+    if isinstance(value, str):
+        items = value.split(";")
+    elif isinstance(value, (set, list, tuple, np.ndarray)):
+        items = value
+    else:
+        return []
+    return sorted({item.strip() for item in items if isinstance(item, str) and item.strip()})
+
+# Define function to get the content hash of a file
+def file_hash(file_name):
+    """
+    Get the sha256 hash of the content of a file
+
+    Parameters:
+    - file_name: name of the file
+
+    Return:
+    Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Define function to find the up-to-date Parquet copy of a hand-off file
+def handoff_parquet_file(csv_file_name):
+    """
+    Find the Parquet copy of a csv hand-off file, if it was written from the current csv
+    The csv is the source of truth: write_handoff saves its content hash in the Parquet
+    metadata, and a copy whose hash does not match the csv (e.g. after a pull) is ignored
+
+    Parameters:
+    - csv_file_name: file name of the csv hand-off file
+
+    Return:
+    File name of the Parquet copy, or None if there is no up-to-date copy
+    """
+    parquet_file_name = os.path.splitext(csv_file_name)[0] + ".parquet"
+    if not os.path.exists(parquet_file_name):
+        return None
+    if not os.path.exists(csv_file_name):
+        return parquet_file_name
+    metadata = pq.read_schema(parquet_file_name).metadata or {}
+    if metadata.get(HANDOFF_HASH_KEY) != file_hash(csv_file_name).encode():
+        return None
+    return parquet_file_name
+
+# Define function to read in a hand-off file from an earlier part
+def read_handoff(csv_file_name):
+    """
+    Read in a hand-off file, using the Parquet version if it is up to date with the csv
+    List columns are read as python lists without parsing every row
+
+    Parameters:
+    - csv_file_name: file name of the csv hand-off file
+
+    Return:
+    Dataframe of the hand-off file
+    """
+    parquet_file_name = handoff_parquet_file(csv_file_name)
+    if parquet_file_name is None:
+        return pd.read_csv(csv_file_name)
+
+    table = pq.read_table(parquet_file_name)
+    handoff = table.to_pandas()
+    # Convert list<string> columns straight from arrow to python lists
+    for column in HANDOFF_LIST_COLUMNS:
+        if column in handoff.columns:
+            handoff[column] = pd.Series(table.column(column).to_pylist(), index=handoff.index, dtype=object)
+    return handoff
+
+# Define function to save a hand-off file for later parts
+def write_handoff(outputs, csv_file_name):
+    """
+    Save a hand-off file as csv and as Parquet
+    The Parquet file keeps authors as list<string> and text codes as categorical columns
+    (authors can be "; " separated strings or sets/lists)
+
+    Parameters:
+    - outputs: research output dataframe
+    - csv_file_name: file name of the csv hand-off file
+    """
+    outputs.to_csv(csv_file_name, index=False)
+
+    handoff = outputs.copy()
+    for column in HANDOFF_LIST_COLUMNS:
+        if column in handoff.columns:
+            handoff[column] = handoff[column].apply(split_handoff_list)
+    for column in HANDOFF_CATEGORY_COLUMNS:
+        if column in handoff.columns:
+            handoff[column] = handoff[column].astype("category")
+    # Save the csv content hash so readers can tell whether the copy is up to date
+    table = pa.Table.from_pandas(handoff, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           HANDOFF_HASH_KEY: file_hash(csv_file_name).encode()})
+    pq.write_table(table, os.path.splitext(csv_file_name)[0] + ".parquet")
+
+# Define test function for write_handoff and read_handoff
+def test_handoff_round_trip():
+    """
+    Test that read_handoff gives back what write_handoff saved,
+    for list columns (strings, sets, missing values) and missing years
+    """
+    # Create test dataframe
+    test_data = pd.DataFrame({
+        "title": ["Paper 1", "Paper 2", "Paper 3"],
+        "authors": ["Susan; David", np.nan, {"Zoe", "Linda"}],
+        "researcher": ["Will", "Aaron", "Will"],
+        "year": [2015, np.nan, 2016]})
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file_name = os.path.join(tmp_dir, "handoff.csv")
+        write_handoff(test_data, csv_file_name)
+        assert os.path.exists(os.path.join(tmp_dir, "handoff.parquet")), "Parquet hand-off file was not saved"
+
+        # Parquet copy: authors as lists, missing year kept
+        test_result = read_handoff(csv_file_name)
+        assert test_result["authors"].tolist() == [["David", "Susan"], [], ["Linda", "Zoe"]], \
+            f"Unexpected authors {test_result['authors'].tolist()}"
+        assert test_result["year"].isna().tolist() == [False, True, False], "Missing year was not kept"
+        assert test_result["researcher"].astype(str).tolist() == ["Will", "Aaron", "Will"], "Researchers don't match"
+
+        # A csv changed after the Parquet copy was saved wins over the stale copy
+        assert handoff_parquet_file(csv_file_name) == os.path.join(tmp_dir, "handoff.parquet")
+        test_data.iloc[:2].to_csv(csv_file_name, index=False)
+        assert handoff_parquet_file(csv_file_name) is None, "Stale Parquet hand-off file was used"
+        assert len(read_handoff(csv_file_name)) == 2, "Stale Parquet hand-off file was read"
+        write_handoff(test_data, csv_file_name)
+
+        # Csv copy splits to the same authors
+        os.remove(os.path.join(tmp_dir, "handoff.parquet"))
+        csv_result = read_handoff(csv_file_name)
+        assert csv_result["authors"].apply(split_handoff_list).tolist()[:2] == [["David", "Susan"], []], \
+            f"Unexpected csv authors {csv_result['authors'].tolist()}"
+
+    print("All test cases passed! (test_handoff_round_trip)")
+
+# Define function to read in and clean the 2024 research output dataset
+def load_2024_data():
+    """
+    Read in 2024 ResearchOutputs.xlsx file and clean it
+    The cleaned dataframe can be shared by the API and webscraping pipelines
+
+    Return:
+    Cleaned 2024 research output dataframe
+    """
     # Read in 2024 ResearchOutputs.xlsx file
     try:
         url = "https://raw.githubusercontent.com/dingkaihua/fsrdc-external-census-projects/master/ResearchOutputs.xlsx"
         outputs_org = pd.read_excel(url, sheet_name='Sheet1')
     except FileNotFoundError:
         print("Error: The file 'ResearchOutputs.xlsx' was not found.")
+        raise
     except Exception as e:
         print(f"An error occurred while reading the Excel file: {str(e)}")
+        raise
 
     # Clean 2024 research output data
-    outputs_org = clean_2024_data(outputs_org)
-    # Call the test function for clean_2024_data
-    test_clean_2024_data()
+    return clean_2024_data(outputs_org)
+
+# Define function to complete Part 3 all steps
+def data_pipeline(API, outputs_org=None, use_ledger=True, match_method="fuzz", year_tolerance=0):
+    """
+    Define function to complete everything for API/ webscrapping data
+    Only new or changed research outputs are matched against the 2024 dataset,
+    decisions for the others are read from the match ledger of previous runs
+    
+    Parameters:
+    - API: whether the data is API data
+    - outputs_org: cleaned 2024 research output dataframe
+    (Read in and cleaned again if not provided)
+    - use_ledger: whether to reuse the match ledger (False recomputes everything)
+    - match_method: "fuzz" (default) to score every 2024 output of the same year,
+    "lsh" to only score title LSH candidates (much faster on large datasets)
+    - year_tolerance: maximum year difference between two matched outputs (lsh only)
+    The defaults give the exported results of the exhaustive same-year matching;
+    "lsh" and year_tolerance > 0 can change which records are unique or matched
+
+    Return:
+    Dictionary with the number of total, unique and non-unique research outputs
+    """
+    # Print messages for information
+    if API:
+        print("Processing API data:")
+    else:
+        print("Processing webscraping data:")
+
+    # Read in and clean 2024 research output data if it is not shared by the caller
+    if outputs_org is None:
+        outputs_org = load_2024_data()
 
     # Read API/ webscraping retrieved researcch outputs from csv file
     try:
         # Read in different files based on if it's API data
         if API:
             # API data
-            outputs = pd.read_csv("part2/openalex_researcher_datasets_matches.csv")
+            outputs = read_handoff("part2/openalex_researcher_datasets_matches.csv")
         else:
             # Webscraping data
-            outputs = pd.read_csv("part1/web_scraping_full_output.csv")      
+            outputs = read_handoff("part1/web_scraping_full_output.csv")
     except FileNotFoundError:
         print("Error: The file was not found.")
     except Exception as e:
@@ -413,49 +1093,28 @@ def data_pipeline(API):
 
     # Clean result research output data
     outputs = clean_retreived_data(outputs)
-    # Call the test function for clean_api_data
-    test_clean_retreived_data()
 
-    # Identify the unique records only by year
-    outputs = find_unique_records_year(outputs_org, outputs)
-    # Call the test function for find_unique_records_year when there are unique years
-    test_find_unique_records_year_with_matches()
-    # Call the test function for find_unique_records_year when there is no unique years
-    test_find_unique_records_year_without_matches()
+    # Build the match ledger file path in the same directory
+    if API:
+        ledger_file_name = os.path.join(script_dir, "match_ledger_api.csv")
+    else:
+        ledger_file_name = os.path.join(script_dir, "match_ledger_webscraping.csv")
 
-    # Identify the unique records using fuzzy matching
-    unique_indices, best_matches = find_unique_records_fuzz(outputs_org, outputs)
-    # Call the test function for find_unique_records_fuzz when there are matches
-    test_find_unique_records_fuzz_with_matches()
-    # Call the test function for find_unique_records_fuzz when all records are unqiue
-    test_find_unique_records_fuzz_all_unique()
+    # Match the new or changed outputs, reuse the ledger decisions for the others
+    outputs, _ = match_research_outputs(outputs_org, outputs, ledger_file_name, use_ledger,
+                                        match_method, year_tolerance)
+    unique_mask = outputs["unique"].to_numpy(dtype=bool)
 
-    # Set unique to be true for unique records retreived by fuzzy matching
-    outputs.loc[outputs.index.isin(unique_indices), "unique"] = True
-
-    # Save the matching information for all matched research outputs
-    # Add best match idx, title, score to outputs
-    outputs["best_match_idx"] = None
-    outputs["best_match_title"] = None
-    outputs["best_match_score"] = None
-
-    # Update the columns for records that have matches
-    for idx, match_info in best_matches.items():
-        match_idx, match_title, match_score = match_info
-        outputs.loc[idx, "best_match_idx"] = match_idx
-        outputs.loc[idx, "best_match_title"] = match_title
-        outputs.loc[idx, "best_match_score"] = match_score
-    
     # Save all unique records in unique_records
     # Based on whether it is API data
     if API:
-        unique_records = outputs.loc[outputs["unique"] == True,
+        unique_records = outputs.loc[unique_mask,
             ['title', 'doi', 'abstract', 'year', 'publication_date',
              'cited_by_count', 'authors', 'affiliations', 'topics',
              'source_display_name', 'type_crossref', 'researcher', 'author_id',
              'queried_dataset_terms', 'matched_dataset_terms', 'location']]
     else:
-        unique_records = outputs.loc[outputs["unique"] == True,
+        unique_records = outputs.loc[unique_mask,
             ['title', 'doi', 'abstract', 'year', 'publication_date',
               'cited_by_count', 'authors', 'affiliations', 'topics',
               'source_display_name', 'type_crossref', 'researcher',
@@ -463,7 +1122,7 @@ def data_pipeline(API):
               'mention_disclosure_review', 'mention_rdc']]
 
     
-    # Export the unique records into a csv file
+    # Export the unique records into a csv file (and a Parquet file for later parts)
     # Based on whether it's API data, give differnt names for files
     # Build the output file path in the same directory
     if API:
@@ -472,13 +1131,13 @@ def data_pipeline(API):
     else:
         unique_output_file_name = os.path.join(script_dir, "unique_outputs_webscraping.csv")
         matched_output_file_name = os.path.join(script_dir, "matched_outputs_webscraping.csv")
-    unique_records.to_csv(unique_output_file_name, index=False)
+    write_handoff(unique_records, unique_output_file_name)
 
     # Save all matched records in matched_records
-    matched_records = outputs[outputs["unique"] == False].drop(columns="unique")
+    matched_records = outputs.loc[~unique_mask].drop(columns=["unique", "output_key", "row_hash"])
 
-    # Export the matched records into a csv file
-    matched_records.to_csv(matched_output_file_name, index=False)
+    # Export the matched records into a csv file (and a Parquet file for later parts)
+    write_handoff(matched_records, matched_output_file_name)
 
     # Print value counts for unique and match records
     print("\nSummary:")
@@ -487,14 +1146,68 @@ def data_pipeline(API):
     print(f"- {len(matched_records)} non-unique research outputs")
     print()
 
+    # Return value counts for unique and match records
+    return {"total": len(outputs), "unique": len(unique_records), "matched": len(matched_records)}
+
+
+# Define function to run all test functions for Part 3
+def run_all_tests():
+    """
+    Run all test functions once, outside of the data pipelines
+    """
+    test_clean_2024_data()
+    test_clean_retreived_data()
+    test_find_unique_records_year_with_matches()
+    test_find_unique_records_year_without_matches()
+    test_find_unique_records_fuzz_with_matches()
+    test_find_unique_records_fuzz_all_unique()
+    test_find_unique_records_lsh()
+    test_get_output_keys()
+    test_match_research_outputs_ledger()
+    test_handoff_round_trip()
 
 # Define function to complete Part 3 all steps
-def part3_pipeline():
-    # Complete everything for API data
-    data_pipeline(True)
-    # Complete everything for webscrapping data
-    data_pipeline(False)
+def part3_pipeline(parallel=True, match_method="fuzz", year_tolerance=0):
+    """
+    Complete everything for both API data and webscrapping data
+    The 2024 research output dataset is read in and cleaned only once
 
-if __name__ == "__main__":
-    part3_pipeline()
+    Parameters:
+    - parallel: whether to run the two pipelines concurrently in worker processes
+    - match_method: "fuzz" (default, exhaustive same-year matching) or "lsh" (see data_pipeline)
+    - year_tolerance: maximum year difference between two matched outputs (lsh only)
 
+    Return:
+    Dictionary with the summary of each pipeline
+    """
+    # Read in and clean 2024 research output data once for both pipelines
+    outputs_org = load_2024_data()
+    options = {"match_method": match_method, "year_tolerance": year_tolerance}
+
+    if not parallel:
+        # Complete everything for API data, then for webscrapping data
+        return {"API": data_pipeline(True, outputs_org, **options),
+                "webscraping": data_pipeline(False, outputs_org, **options)}
+
+    # Complete everything for API data and webscrapping data at the same time
+    # Both workers get the same cleaned 2024 dataframe
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        api_future = executor.submit(data_pipeline, True, outputs_org, **options)
+        webscraping_future = executor.submit(data_pipeline, False, outputs_org, **options)
+        return {"API": api_future.result(),
+                "webscraping": webscraping_future.result()}
+
+if __name__ == "__main__":
+    import argparse
+
+    # Matching options, e.g. python data_processing.py --match-method lsh --year-tolerance 1
+    parser = argparse.ArgumentParser(description="Part 3: match research outputs against the 2024 dataset")
+    parser.add_argument("--match-method", choices=["fuzz", "lsh"], default="fuzz",
+                        help="fuzz: score every 2024 output of the same year; lsh: score title LSH candidates only")
+    parser.add_argument("--year-tolerance", type=int, default=0,
+                        help="maximum year difference between two matched outputs (lsh only)")
+    parser.add_argument("--serial", action="store_true", help="run the API and webscraping pipelines one after the other")
+    args = parser.parse_args()
+
+    run_all_tests()
+    part3_pipeline(parallel=not args.serial, match_method=args.match_method, year_tolerance=args.year_tolerance)
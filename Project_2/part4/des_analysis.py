@@ -1,18 +1,445 @@
 # Import libraries
 import simpy
-import random
 import numpy as np
 import matplotlib.pyplot as plt
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats as scipy_stats
+from scipy.stats import qmc
+import itertools
+import pandas as pd
+import os
+import time
+import heapq
+from collections import deque, namedtuple
 
-# Set random seed for reproducibility
-random.seed(42)
-np.random.seed(42)
+script_dir = os.path.dirname(os.path.realpath(__file__))
 
-# Track wait times at each stage
-wait_times = []
+# Wait types recorded by research_paper, and the outcomes that end a paper
+WAIT_TYPES = ["editor_wait", "peer_reviewer_wait", "revision_reviewer_wait",
+              "editor_reject", "peer_reviewer_reject", "published"]
+OUTCOMES = ["published", "editor_reject", "peer_reviewer_reject"]
 
-def research_paper(env, paper_id, editors, peer_reviewers, authors):
+# Model parameters and their base values
+DEFAULT_PARAMETERS = {
+    'submission_frequency': 3,      # average days between submissions
+    'editors_capacity': 2,          # number of editors
+    'reviewers_capacity': 5,        # number of peer reviewers
+    'editor_reject_prob': 0.3,      # chance of rejection in the initial review
+    'reviewer_reject_prob': 0.3,    # chance of rejection in peer review
+    'revision_prob': 0.5,           # chance of needing another revision round
+    'max_revisions': 3,             # maximum revision rounds
+}
+# Parameters that must be whole numbers
+INTEGER_PARAMETERS = ['editors_capacity', 'reviewers_capacity', 'max_revisions']
+# Revision rounds drawn for every paper, whatever max_revisions is, so the random
+# streams stay aligned across scenarios (upper bound for max_revisions)
+MAX_REVISION_ROUNDS = 10
+
+def model_parameters(**overrides):
+    """
+    Model parameters: DEFAULT_PARAMETERS with the given values replaced
+    """
+    unknown = set(overrides) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown model parameters {sorted(unknown)}, expected some of {list(DEFAULT_PARAMETERS)}")
+    params = {**DEFAULT_PARAMETERS, **overrides}
+    if params['max_revisions'] > MAX_REVISION_ROUNDS:
+        raise ValueError(f"max_revisions is {params['max_revisions']}, at most {MAX_REVISION_ROUNDS} revision rounds are drawn")
+    return params
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with the P-square algorithm (Jain and Chlamtac, 1985):
+    five markers whose heights are adjusted with piecewise-parabolic interpolation,
+    so memory is constant no matter how many observations arrive. The first
+    exact_size values are kept and give the exact quantile until the markers are placed
+    """
+    def __init__(self, p, exact_size=64):
+        self.p = p
+        self.exact_size = exact_size
+        self.buffer = []  # first values, kept exactly until the markers are placed
+        self.heights = None
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def _place_markers(self):
+        # Markers at the desired positions 1 + (n - 1) * increments of the sorted first values
+        values = sorted(self.buffer)
+        n = len(values)
+        self.desired = [1 + (n - 1) * increment for increment in self.increments]
+        self.positions = []
+        for i, desired in enumerate(self.desired):
+            position = min(max(int(round(desired)), self.positions[-1] + 1 if self.positions else 1), n - 4 + i)
+            self.positions.append(position)
+        self.heights = [values[position - 1] for position in self.positions]
+        self.buffer = None
+
+    def add(self, x):
+        if self.heights is None:
+            self.buffer.append(x)
+            if len(self.buffer) == max(self.exact_size, 5):
+                self._place_markers()
+            return
+        heights, positions = self.heights, self.positions
+
+        # Find the cell of x and update the extreme markers
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+                    (positions[i] - positions[i - 1] + d) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+                    + (positions[i + 1] - positions[i] - d) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+                if not heights[i - 1] < candidate < heights[i + 1]:
+                    # Parabolic step would break the marker order, use a linear one
+                    candidate = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = candidate
+                positions[i] += d
+
+    def value(self):
+        if self.heights is None:
+            return float(np.quantile(self.buffer, self.p)) if self.buffer else np.nan
+        return self.heights[2]
+
+class BatchSeries:
+    """
+    Means of consecutive batches of batch_size values of one stream, for warm-up
+    detection (MSER) and batch means steady-state estimates. Beyond max_batches,
+    adjacent batches are merged and the batch size doubles, so memory stays bounded
+    """
+    def __init__(self, batch_size=5, max_batches=4096):
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.means = []
+        self.partial_sum = 0.0
+        self.partial_count = 0
+
+    def add(self, x):
+        self.partial_sum += x
+        self.partial_count += 1
+        if self.partial_count == self.batch_size:
+            self.means.append(self.partial_sum / self.batch_size)
+            self.partial_sum, self.partial_count = 0.0, 0
+            if len(self.means) > self.max_batches:
+                self._merge()
+
+    def _merge(self):
+        # An odd last batch becomes the start of the next (twice as large) batch
+        if len(self.means) % 2:
+            self.partial_sum += self.means.pop() * self.batch_size
+            self.partial_count += self.batch_size
+        self.means = [(a + b) / 2 for a, b in zip(self.means[0::2], self.means[1::2])]
+        self.batch_size *= 2
+
+    def truncation(self):
+        """
+        MSER warm-up detection (MSER-5 with the default batch size): the number d of
+        leading batches whose deletion minimizes the squared standard error of the
+        mean of the rest, sum((Z[d:] - mean(Z[d:]))^2) / (n - d)^2, for d up to n / 2
+        """
+        means = np.asarray(self.means)
+        n = len(means)
+        if n < 4:
+            return 0
+        # Sums of Z[d:] and Z[d:]^2 for every d
+        tail_sums = np.cumsum(means[::-1])[::-1]
+        tail_squares = np.cumsum(means[::-1] ** 2)[::-1]
+        remaining = np.arange(n, 0, -1)
+        mser = (tail_squares - tail_sums ** 2 / remaining) / remaining ** 2
+        return int(np.argmin(mser[:n // 2 + 1]))
+
+    def steady_state(self, num_batches=20, confidence=0.95):
+        """
+        Batch means estimate of the steady-state mean after MSER warm-up truncation:
+        the remaining batches are grouped into num_batches equal batches whose means
+        are treated as independent (check with their lag-1 autocorrelation)
+
+        Returns:
+        - dict with the warm-up length (values), the mean, its confidence interval,
+        the batch size (values) and the lag-1 autocorrelation of the batch means
+        """
+        deleted = self.truncation()
+        means = np.asarray(self.means[deleted:])
+        group_size = len(means) // num_batches
+        result = {'warmup': deleted * self.batch_size, 'mean': np.nan, 'ci_low': np.nan, 'ci_high': np.nan,
+                  'batch_size': group_size * self.batch_size, 'lag1': np.nan}
+        if group_size == 0:
+            return result
+        # Drop the leftover batches at the start, next to the warm-up
+        batch_means = means[len(means) - group_size * num_batches:].reshape(num_batches, group_size).mean(axis=1)
+        mean = batch_means.mean()
+        half_width = scipy_stats.t.ppf((1 + confidence) / 2, num_batches - 1) * batch_means.std(ddof=1) / np.sqrt(num_batches)
+        deviations = batch_means - mean
+        result.update(mean=mean, ci_low=mean - half_width, ci_high=mean + half_width,
+                      lag1=np.sum(deviations[:-1] * deviations[1:]) / np.sum(deviations ** 2))
+        return result
+
+class StreamingStatistics:
+    """
+    Constant-memory statistics of one stream of values: count, Welford mean and
+    variance, min, max, P-square quantiles, an optional bounded reservoir sample and
+    optional batch means of the series (BatchSeries)
+    """
+    def __init__(self, quantiles=(0.5, 0.9, 0.95), reservoir_size=0, rng=None, batch_series=False):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.quantiles = {q: P2Quantile(q) for q in quantiles}
+        self.reservoir_size = reservoir_size
+        self.reservoir = []
+        self.rng = rng
+        self.series = BatchSeries() if batch_series else None
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        for estimator in self.quantiles.values():
+            estimator.add(x)
+        if self.reservoir_size:
+            # Reservoir sampling (Algorithm R): every value is kept with equal probability
+            if len(self.reservoir) < self.reservoir_size:
+                self.reservoir.append(x)
+            else:
+                j = self.rng.integers(self.count)
+                if j < self.reservoir_size:
+                    self.reservoir[j] = x
+        if self.series is not None:
+            self.series.add(x)
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    def summary(self):
+        summary = {'count': self.count, 'mean': self.mean, 'variance': self.variance(),
+                   'std': np.sqrt(self.variance()), 'min': self.min, 'max': self.max}
+        for q, estimator in self.quantiles.items():
+            summary['median' if q == 0.5 else f"p{round(q * 100)}"] = estimator.value()
+        return summary
+
+class WaitTimeCollector:
+    """
+    Per-environment collector of (wait type, time) records keeping streaming
+    statistics per wait type instead of the records themselves
+
+    It has the list method research_paper uses (append), so it replaces the wait_times list
+
+    Parameters:
+    - quantiles: quantiles estimated for every wait type
+    - reservoir_size: size of the reservoir sample kept per wait type (0 = none), e.g. for plots
+    - seed: seed of the reservoir sampling stream (separate from the simulation stream)
+    - batch_series: keep the batch means of every wait type in recording order, for
+    warm-up truncation and steady-state estimates (steady_state)
+    """
+    def __init__(self, quantiles=(0.5, 0.9, 0.95), reservoir_size=0, seed=0, batch_series=False):
+        self.quantiles = quantiles
+        self.reservoir_size = reservoir_size
+        self.batch_series = batch_series
+        self.monitor = None  # ResourceMonitor of the run, if it was monitored
+        self.rng = np.random.default_rng(seed) if reservoir_size else None
+        self.statistics = {}
+
+    def append(self, record):
+        wait_type, time = record
+        if wait_type not in self.statistics:
+            self.statistics[wait_type] = StreamingStatistics(self.quantiles, self.reservoir_size, self.rng, self.batch_series)
+        self.statistics[wait_type].add(time)
+
+    @classmethod
+    def from_records(cls, wait_times, **kwargs):
+        collector = cls(**kwargs)
+        for record in wait_times:
+            collector.append(record)
+        return collector
+
+    def count(self, wait_type):
+        return self.statistics[wait_type].count if wait_type in self.statistics else 0
+
+    def stats(self):
+        """
+        Returns: dict of wait type -> summary statistics, for the wait types that occurred
+        """
+        return {wait_type: statistics.summary() for wait_type, statistics in self.statistics.items()}
+
+    def sample(self, wait_type):
+        """
+        Returns: the reservoir sample of one wait type
+        """
+        return list(self.statistics[wait_type].reservoir) if wait_type in self.statistics else []
+
+    def steady_state(self, num_batches=20, confidence=0.95):
+        """
+        Returns: dict of wait type -> BatchSeries.steady_state result (needs batch_series=True)
+        """
+        return {wait_type: statistics.series.steady_state(num_batches, confidence)
+                for wait_type, statistics in self.statistics.items()}
+
+# Resources sampled by ResourceMonitor
+MONITORED_RESOURCES = ['editors', 'peer_reviewers', 'authors']
+
+class ResourceMonitor:
+    """
+    Samples the queue length and the number in service of every resource
+    (MONITORED_RESOURCES) every interval days into arrays allocated up front
+
+    Parameters:
+    - sim_time: simulation time in terms of days
+    - interval: days between samples
+    - capacities: capacity of every resource (inf for the authors)
+    """
+    def __init__(self, sim_time, interval, capacities):
+        self.interval = interval
+        self.times = np.arange(0, sim_time, interval, dtype=float)
+        self.capacities = np.asarray(capacities, dtype=float)
+        self.queue = np.zeros((len(MONITORED_RESOURCES), len(self.times)), dtype=np.int32)
+        self.in_service = np.zeros((len(MONITORED_RESOURCES), len(self.times)), dtype=np.int32)
+        self.samples = 0  # samples recorded so far
+        self.next_time = 0.0 if len(self.times) else np.inf
+
+    def record(self, queue_lengths, in_service):
+        """
+        Record the sample due now (SimPy monitor process)
+        """
+        self.queue[:, self.samples] = queue_lengths
+        self.in_service[:, self.samples] = in_service
+        self.samples += 1
+
+    def record_until(self, now, queue_lengths, in_service):
+        """
+        Record all samples due before now, given the state since the previous event
+        (heap engine: the state only changes at events)
+        """
+        # Samples at k * interval < now
+        end = min(int(np.ceil(now / self.interval)), len(self.times))
+        for k in range(self.samples, end):
+            self.queue[:, k] = queue_lengths
+            self.in_service[:, k] = in_service
+        self.samples = max(self.samples, end)
+        self.next_time = end * self.interval if end < len(self.times) else np.inf
+
+    def summary(self):
+        """
+        Returns: dict of resource -> utilization (mean in service / capacity, NaN for
+        unlimited resources), time-average queue length, maximum queue length and mean
+        number in service, estimated from the samples
+        """
+        queue, in_service = self.queue[:, :self.samples], self.in_service[:, :self.samples]
+        summary = {}
+        for i, resource in enumerate(MONITORED_RESOURCES):
+            mean_in_service = in_service[i].mean() if self.samples else np.nan
+            summary[resource] = {
+                'utilization': mean_in_service / self.capacities[i] if np.isfinite(self.capacities[i]) else np.nan,
+                'mean_queue': queue[i].mean() if self.samples else np.nan,
+                'max_queue': int(queue[i].max()) if self.samples else 0,
+                'mean_in_service': mean_in_service}
+        return summary
+
+    def to_frame(self):
+        """
+        Returns: tidy dataframe of the samples (time, resource, queue length, in service, utilization)
+        """
+        frames = []
+        for i, resource in enumerate(MONITORED_RESOURCES):
+            frames.append(pd.DataFrame({
+                'time': self.times[:self.samples], 'resource': resource,
+                'queue_length': self.queue[i, :self.samples], 'in_service': self.in_service[i, :self.samples],
+                'utilization': self.in_service[i, :self.samples] / self.capacities[i]}))
+        return pd.concat(frames, ignore_index=True)
+
+class RandomBlocks:
+    """
+    Draws from a numpy Generator in blocks, handed out one value at a time
+    (scalar numpy draws cost more than the rest of a simulation event)
+    """
+    def __init__(self, rng, size=4096):
+        self.rng = rng
+        self.size = size
+        self.exponentials, self.exponential_index = [], size
+        self.uniforms, self.uniform_index = [], size
+
+    def exponential(self, scale):
+        if self.exponential_index == self.size:
+            self.exponentials, self.exponential_index = self.rng.standard_exponential(self.size).tolist(), 0
+        self.exponential_index += 1
+        return scale * self.exponentials[self.exponential_index - 1]
+
+    def random(self):
+        if self.uniform_index == self.size:
+            self.uniforms, self.uniform_index = self.rng.random(self.size).tolist(), 0
+        self.uniform_index += 1
+        return self.uniforms[self.uniform_index - 1]
+
+# Random streams, one per stochastic element of the model
+STREAMS = ['arrival', 'editor_time', 'review_time', 'reject', 'revision']
+
+# Random attributes of one paper, drawn when it is submitted
+PaperAttributes = namedtuple('PaperAttributes', ['editor_time', 'editor_reject', 'review_time', 'reviewer_reject',
+                                                 'revision_needed', 'revision_times', 'revision_review_times'])
+
+class RandomStreams:
+    """
+    Dedicated random streams for the stochastic elements of the model (STREAMS)
+
+    Every paper draws all its attributes from these streams when it is submitted,
+    so the n-th paper gets the same editor time, review times and decisions in
+    every scenario run with the same seed (common random numbers): scenarios differ
+    only by their parameters, not by their luck
+
+    Parameters:
+    - seed: int or numpy SeedSequence; the streams are its first len(STREAMS)
+    spawned children, derived without changing the SeedSequence itself
+    """
+    def __init__(self, seed):
+        seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.streams = {}
+        for k, name in enumerate(STREAMS):
+            child = np.random.SeedSequence(seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (k,),
+                                           pool_size=seed_sequence.pool_size)
+            self.streams[name] = RandomBlocks(np.random.default_rng(child))
+
+    def interarrival_time(self, submission_frequency):
+        return self.streams['arrival'].exponential(submission_frequency)
+
+    def paper(self, params):
+        """
+        Draw the attributes of one paper: editor time (average 5 days), peer review
+        time (average 7 days), rejection decisions, and for each possible revision
+        round whether it is needed, the revision time (average 7 days) and the
+        revision check time (average 5 days). MAX_REVISION_ROUNDS rounds are always
+        drawn, so the n-th paper gets the same values whatever max_revisions is
+        """
+        review, reject, revision = self.streams['review_time'], self.streams['reject'], self.streams['revision']
+        rounds = range(MAX_REVISION_ROUNDS)
+        return PaperAttributes(
+            editor_time=self.streams['editor_time'].exponential(5),
+            editor_reject=reject.random() < params['editor_reject_prob'],
+            review_time=review.exponential(7),
+            reviewer_reject=reject.random() < params['reviewer_reject_prob'],
+            revision_needed=[revision.random() < params['revision_prob'] for _ in rounds],
+            revision_times=[revision.exponential(7) for _ in rounds],
+            revision_review_times=[review.exponential(5) for _ in rounds])
+
+def research_paper(env, paper_id, editors, peer_reviewers, authors, streams, wait_times, params=DEFAULT_PARAMETERS):
     """
     Simulate the process that a single research paper will go through:
     Inital Review, Peer Review, and Revision before getting published
@@ -23,9 +450,14 @@ def research_paper(env, paper_id, editors, peer_reviewers, authors):
     - editors: Resource of editors
     - peer_reviewer: Resource of peer reviewers
     - authors: Resource of authors
+    - streams: RandomStreams of this replication
+    - wait_times: collector of (wait type, time) records of this replication (WaitTimeCollector or list)
+    - params: model parameters (see DEFAULT_PARAMETERS)
     """
     # Get the submission time
     submission_time = env.now
+    # Draw the random attributes of the paper
+    attributes = streams.paper(params)
     
     # Initial review process
     with editors.request() as req:
@@ -35,11 +467,10 @@ def research_paper(env, paper_id, editors, peer_reviewers, authors):
         wait_times.append(('editor_wait', env.now - submission_time))
 
         # Assume initial review takes average of 5 days
-        editor_time = random.expovariate(1.0/5)
-        yield env.timeout(editor_time)
+        yield env.timeout(attributes.editor_time)
         
-        # Assume there is 30% chance to be rejected by editor
-        if random.random() < 0.3:
+        # Assume there is 30% chance to be rejected by editor (editor_reject_prob)
+        if attributes.editor_reject:
             # Save the time for the editor to reject
             wait_times.append(('editor_reject', env.now - submission_time))
             return
@@ -55,11 +486,10 @@ def research_paper(env, paper_id, editors, peer_reviewers, authors):
         wait_times.append(('peer_reviewer_wait', env.now - editor_done_time))
         
         # Assume peer review takes average of 7 days
-        review_time = random.expovariate(1.0/7)
-        yield env.timeout(review_time)
+        yield env.timeout(attributes.review_time)
         
-        # Assume there is 30% chance of being reject by peer reviewer
-        if random.random() < 0.3:
+        # Assume there is 30% chance of being reject by peer reviewer (reviewer_reject_prob)
+        if attributes.reviewer_reject:
             # Save the time for the peer reviewer to reject
             wait_times.append(('peer_reviewer_reject', env.now - submission_time))
             return
@@ -68,12 +498,12 @@ def research_paper(env, paper_id, editors, peer_reviewers, authors):
     peer_reviewer_done_time = env.now
     
     # Revision Process
-    # Assume that a reasearch papaer could go through revision at most three times
+    # Assume that a reasearch papaer could go through revision at most three times (max_revisions)
     revision_rounds = 0
-    max_revisions = 3
+    max_revisions = params['max_revisions']
 
-    # Assume that there is 50% of chance that the paper needs another round of revision
-    while revision_rounds < max_revisions and random.random() < 0.5:
+    # Assume that there is 50% of chance that the paper needs another round of revision (revision_prob)
+    while revision_rounds < max_revisions and attributes.revision_needed[revision_rounds]:
 
         # Keep track of the revision rounds
         revision_rounds += 1
@@ -83,8 +513,7 @@ def research_paper(env, paper_id, editors, peer_reviewers, authors):
             yield req
             
             # Assume it takes average of 7 days for revision
-            revision_time = random.expovariate(1.0/7)
-            yield env.timeout(revision_time)
+            yield env.timeout(attributes.revision_times[revision_rounds - 1])
         
         # Mark the time when author finished revision
         revision_done_time = env.now
@@ -97,8 +526,7 @@ def research_paper(env, paper_id, editors, peer_reviewers, authors):
             wait_times.append(('revision_reviewer_wait', env.now - revision_done_time))
             
             # Assume it takes average of 5 days to check for the revision
-            revision_review_time = random.expovariate(1.0/5)
-            yield env.timeout(revision_review_time)
+            yield env.timeout(attributes.revision_review_times[revision_rounds - 1])
         
         # Mark the time that peer reviewer finished checking revision
         review_done_time = env.now
@@ -106,7 +534,7 @@ def research_paper(env, paper_id, editors, peer_reviewers, authors):
     # Save the time it takes for a research paper to be published
     wait_times.append(('published', env.now - submission_time))
 
-def paper_generator(env, editors, peer_reviewers, authors, submission_frequency):
+def paper_generator(env, editors, peer_reviewers, authors, submission_frequency, streams, wait_times, params=DEFAULT_PARAMETERS):
     """
     Generates paper submissions at a given rate
 
@@ -116,43 +544,46 @@ def paper_generator(env, editors, peer_reviewers, authors, submission_frequency)
     - peer_reviewer: Resource of peer reviewers
     - authors: Resource of authors
     - submission_frequency: Submission frequency for paper submisson
+    - streams: RandomStreams of this replication
+    - wait_times: collector of (wait type, time) records of this replication (WaitTimeCollector or list)
+    - params: model parameters passed on to research_paper
     """
     # Keep track of the paper id 
     paper_id = 0
     while True:
         paper_id += 1
-        yield env.timeout(random.expovariate(1/submission_frequency))
+        yield env.timeout(streams.interarrival_time(submission_frequency))
         # Process the research paper
-        env.process(research_paper(env, f"Paper {paper_id}", editors, peer_reviewers, authors))
+        env.process(research_paper(env, f"Paper {paper_id}", editors, peer_reviewers, authors, streams, wait_times, params))
+
+def monitor_resources(env, monitor, resources):
+    """
+    Record a ResourceMonitor sample of the resources every monitor.interval days
+    """
+    for _ in range(len(monitor.times)):
+        monitor.record([len(resource.queue) for resource in resources], [resource.count for resource in resources])
+        yield env.timeout(monitor.interval)
 
 def analyze_results(wait_times, sim_time):
     """
     Analyze the simulation results with statistics
+
+    wait_times can be a WaitTimeCollector or a list of (wait type, time) records
     """
     try:
-        # Organize wait times by type, save it in the dictionary
-        wait_times_dict = defaultdict(list)
-        for wait_type, time in wait_times:
-            wait_times_dict[wait_type].append(time)
-        
-        # Calculate statistics for different type of wait time
-        stats = {}
-        for wait_type, time in wait_times_dict.items():
-            stats[wait_type] = {
-                'count': len(time),
-                'mean': np.mean(time) if time else 0,
-                'median': np.median(time) if time else 0,
-                'min': min(time) if time else 0,
-                'max': max(time) if time else 0
-            }
+        # Streaming statistics by wait type
+        collector = wait_times if isinstance(wait_times, WaitTimeCollector) else WaitTimeCollector.from_records(wait_times)
+
+        # Statistics for different type of wait time (count, mean, median, min, max, ...)
+        stats = collector.stats()
         
         # Print summary statistics
         print(f"Simulation completed over {sim_time} days")
-        total_paper_submissions = sum(len(wait_times_dict[t]) for t in ['published', 'editor_reject', 'peer_reviewer_reject'])
+        total_paper_submissions = sum(collector.count(t) for t in ['published', 'editor_reject', 'peer_reviewer_reject'])
         print(f"Total paper submissions: {total_paper_submissions}")
-        print(f"Papers published: {len(wait_times_dict['published'])} ({len(wait_times_dict['published'])/total_paper_submissions:.2%})")
-        print(f"Papers rejected during initial review: {len(wait_times_dict['editor_reject'])}")
-        print(f"Papers rejected during peer review: {len(wait_times_dict['peer_reviewer_reject'])}")
+        print(f"Papers published: {collector.count('published')} ({collector.count('published')/total_paper_submissions:.2%})")
+        print(f"Papers rejected during initial review: {collector.count('editor_reject')}")
+        print(f"Papers rejected during peer review: {collector.count('peer_reviewer_reject')}")
         print("\nWait time statistics (in days):")
         for wait_type in ["editor_wait", "peer_reviewer_wait",
                         "revision_reviewer_wait", "editor_reject", 
@@ -161,10 +592,189 @@ def analyze_results(wait_times, sim_time):
                 print(f"  Total time for {wait_type} papers: {stats[wait_type]['mean']:.2f} days (average)")
             else:
                 print(f"  {wait_type}: {stats[wait_type]['mean']:.2f} days (average)")
+
+        # Resource usage from the monitor samples
+        if collector.monitor is not None:
+            print(f"\nResource usage (sampled every {collector.monitor.interval:g} days):")
+            for resource, usage in collector.monitor.summary().items():
+                utilization = f"{usage['utilization']:.1%} utilization, " if np.isfinite(usage['utilization']) else ""
+                print(f"  {resource}: {utilization}{usage['mean_in_service']:.2f} in service, "
+                      f"{usage['mean_queue']:.2f} waiting (average), {usage['max_queue']} waiting (max)")
     except Exception as e:
         print(f"An error occurred while analyzing the result: {str(e)}")
 
-def run_simulation(sim_time=365, submission_frequency=3, editors_capacity=2):
+def run_simpy_model(env, sim_time, params, streams, wait_times, monitor=None):
+    """
+    Build the SimPy model of the review process in env and run it until sim_time,
+    sampling the resources into monitor if given
+    """
+    # Create resources
+    editors = simpy.Resource(env, capacity=int(params['editors_capacity']))
+    peer_reviewers = simpy.Resource(env, capacity=int(params['reviewers_capacity']))
+    authors = simpy.Resource(env, capacity=float('inf'))
+
+    # Start paper generation process
+    env.process(paper_generator(env, editors, peer_reviewers, authors, params['submission_frequency'], streams, wait_times, params))
+    if monitor is not None:
+        env.process(monitor_resources(env, monitor, [editors, peer_reviewers, authors]))
+
+    # Run simulation
+    env.run(until=sim_time)
+
+# Event types of the heap engine
+ARRIVAL, EDITOR_DONE, REVIEW_DONE, REVISION_DONE, REVISION_REVIEW_DONE = range(5)
+
+def run_heap_model(sim_time, params, streams, wait_times, monitor=None):
+    """
+    Specialized event engine for the review process: a heapq event calendar, entity
+    state in lists indexed by paper, integer counters for free editors and reviewers
+    and FIFO queues of waiting papers
+
+    Follows research_paper step by step (same paper attributes from the same
+    streams, FCFS queues, same records), so it gives the same results as the SimPy
+    model for the same seed. The resources are sampled into monitor if given
+
+    Returns:
+    - number of events processed
+    """
+    record = wait_times.append
+    max_revisions, submission_frequency = params['max_revisions'], params['submission_frequency']
+
+    # Entity state by paper id: attributes, submission time, time it joined its current queue, revision rounds
+    papers, submitted, queued, rounds = [], [], [], []
+    editors_capacity, reviewers_capacity = int(params['editors_capacity']), int(params['reviewers_capacity'])
+    free_editors, free_reviewers, in_revision = editors_capacity, reviewers_capacity, 0
+    editor_queue, reviewer_queue = deque(), deque()  # paper ids / (paper id, is revision check)
+    next_sample = monitor.next_time if monitor is not None else np.inf
+    calendar = [(streams.interarrival_time(submission_frequency), 0, ARRIVAL, -1)]
+    sequence = 1  # tie breaker so equal times keep scheduling order
+    events = 0
+
+    def start_editor(paper, now):
+        nonlocal sequence
+        record(('editor_wait', now - queued[paper]))
+        heapq.heappush(calendar, (now + papers[paper].editor_time, sequence, EDITOR_DONE, paper))
+        sequence += 1
+
+    def start_reviewer(paper, is_revision, now):
+        nonlocal sequence
+        if is_revision:
+            record(('revision_reviewer_wait', now - queued[paper]))
+            heapq.heappush(calendar, (now + papers[paper].revision_review_times[rounds[paper] - 1], sequence,
+                                      REVISION_REVIEW_DONE, paper))
+        else:
+            record(('peer_reviewer_wait', now - queued[paper]))
+            heapq.heappush(calendar, (now + papers[paper].review_time, sequence, REVIEW_DONE, paper))
+        sequence += 1
+
+    while calendar:
+        now, _, event, paper = heapq.heappop(calendar)
+        if now > next_sample:
+            # Samples due since the previous event see the state it left
+            monitor.record_until(min(now, sim_time), (len(editor_queue), len(reviewer_queue), 0),
+                                 (editors_capacity - free_editors, reviewers_capacity - free_reviewers, in_revision))
+            next_sample = monitor.next_time
+        if now >= sim_time:
+            break
+        events += 1
+
+        if event == ARRIVAL:
+            paper = len(submitted)
+            papers.append(streams.paper(params))
+            submitted.append(now)
+            queued.append(now)
+            rounds.append(0)
+            heapq.heappush(calendar, (now + streams.interarrival_time(submission_frequency), sequence, ARRIVAL, -1))
+            sequence += 1
+            if free_editors:
+                free_editors -= 1
+                start_editor(paper, now)
+            else:
+                editor_queue.append(paper)
+            continue
+
+        if event == EDITOR_DONE:
+            # Hand the editor to the next waiting paper
+            if editor_queue:
+                start_editor(editor_queue.popleft(), now)
+            else:
+                free_editors += 1
+            if papers[paper].editor_reject:
+                record(('editor_reject', now - submitted[paper]))
+                continue
+            requests = [(paper, False)]
+        elif event == REVISION_DONE:
+            in_revision -= 1
+            requests = [(paper, True)]
+        else:
+            # REVIEW_DONE or REVISION_REVIEW_DONE: hand the reviewer to the next waiting paper
+            if reviewer_queue:
+                start_reviewer(*reviewer_queue.popleft(), now)
+            else:
+                free_reviewers += 1
+            if event == REVIEW_DONE and papers[paper].reviewer_reject:
+                record(('peer_reviewer_reject', now - submitted[paper]))
+                continue
+            # Another revision round, or published
+            if rounds[paper] < max_revisions and papers[paper].revision_needed[rounds[paper]]:
+                heapq.heappush(calendar, (now + papers[paper].revision_times[rounds[paper]], sequence, REVISION_DONE, paper))
+                rounds[paper] += 1
+                in_revision += 1
+                sequence += 1
+            else:
+                record(('published', now - submitted[paper]))
+            continue
+
+        # Request a peer reviewer
+        for request in requests:
+            queued[paper] = now
+            if free_reviewers:
+                free_reviewers -= 1
+                start_reviewer(*request, now)
+            else:
+                reviewer_queue.append(request)
+    return events
+
+# Simulation engines: SimPy processes, or the specialized heap engine
+ENGINES = ['simpy', 'heap']
+
+def simulate(sim_time=365, submission_frequency=3, editors_capacity=2, seed=42, reservoir_size=0, engine='simpy',
+             batch_series=False, monitor_interval=None, **parameters):
+    """
+    Run one replication of the simulation with its own random stream and collector
+
+    Parameters:
+    - sim_time: simulation time in terms of days
+    - submission_frequency: frequency for paper submission
+    - editors_capacity: number of editors available
+    - seed: int or numpy SeedSequence for this replication's random streams (RandomStreams)
+    - reservoir_size: size of the reservoir sample kept per wait type (0 = none)
+    - engine: 'simpy' (research_paper processes) or 'heap' (run_heap_model, faster)
+    - batch_series: keep the batch means of every wait type (see WaitTimeCollector)
+    - monitor_interval: days between ResourceMonitor samples (None = no monitoring)
+    - parameters: other model parameters (see DEFAULT_PARAMETERS)
+
+    Returns:
+    - WaitTimeCollector with the streaming statistics of every wait type, and the
+    ResourceMonitor of the run in its monitor attribute
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+    params = model_parameters(submission_frequency=submission_frequency, editors_capacity=editors_capacity, **parameters)
+    streams = RandomStreams(seed)
+    wait_times = WaitTimeCollector(reservoir_size=reservoir_size, batch_series=batch_series)
+    if monitor_interval:
+        wait_times.monitor = ResourceMonitor(sim_time, monitor_interval,
+                                             [params['editors_capacity'], params['reviewers_capacity'], np.inf])
+
+    if engine == 'heap':
+        run_heap_model(sim_time, params, streams, wait_times, wait_times.monitor)
+    else:
+        # Create SimPy environment
+        run_simpy_model(simpy.Environment(), sim_time, params, streams, wait_times, wait_times.monitor)
+    return wait_times
+
+def run_simulation(sim_time=365, submission_frequency=3, editors_capacity=2, seed=42, monitor_interval=1, **parameters):
     """
     Run the simulation for the specified time
 
@@ -172,38 +782,704 @@ def run_simulation(sim_time=365, submission_frequency=3, editors_capacity=2):
     - sim_time: simulation time in terms of days
     - submission_frequency: frequency for paper submission
     - editors_capacity: number of editors available
+    - seed: random seed of the run
+    - monitor_interval: days between resource samples (None = no monitoring)
+    - parameters: other model parameters (see DEFAULT_PARAMETERS)
+
+    Returns:
+    - WaitTimeCollector with the streaming statistics of every wait type
     """
-    # reset wait times
-    wait_times.clear()
-    
-    # Create SimPy environment
-    env = simpy.Environment()
-    
-    # Create resources
-    editors = simpy.Resource(env, capacity=editors_capacity)
-    peer_reviewers = simpy.Resource(env, capacity=5)
-    authors = simpy.Resource(env, capacity=float('inf'))
-    
-    # Start paper generation process
-    env.process(paper_generator(env, editors, peer_reviewers, authors, submission_frequency))
-    
-    # Run simulation
-    env.run(until=sim_time)
-    
+    wait_times = simulate(sim_time, submission_frequency, editors_capacity, seed,
+                          monitor_interval=monitor_interval, **parameters)
+
     # Analyze the simulation results
     analyze_results(wait_times, sim_time)
+    return wait_times
+
+def run_steady_state(sim_time=36500, submission_frequency=3, editors_capacity=2, seed=42, num_batches=20,
+                     confidence=0.95, engine='simpy', **parameters):
+    """
+    Steady-state wait times from one long run instead of many replications: the
+    start-up period of each wait type is cut with MSER-5 and the rest estimated
+    with batch means (see BatchSeries)
+
+    Parameters:
+    - sim_time: length of the run in days (long: the default is 100 years)
+    - num_batches: number of batches of the batch means estimate
+    - confidence: confidence level of the intervals
+    - other parameters: as in simulate
+
+    Returns:
+    - dataframe with one row per wait type: count, warm-up values cut, mean over the
+    whole run, steady-state mean and confidence interval, batch size and the lag-1
+    autocorrelation of the batch means (near 0 when batches are large enough)
+    """
+    collector = simulate(sim_time, submission_frequency, editors_capacity, seed, engine=engine, batch_series=True, **parameters)
+    steady_state = collector.steady_state(num_batches, confidence)
+    rows = []
+    for wait_type in WAIT_TYPES:
+        if collector.count(wait_type):
+            rows.append({'wait_type': wait_type, 'count': collector.count(wait_type),
+                         'raw_mean': collector.statistics[wait_type].mean, **steady_state[wait_type]})
+    return pd.DataFrame(rows)
+
+def summarize_replication(wait_times):
+    """
+    Reduce one replication to the numbers compared across replications:
+    paper counts per outcome, the publication rate, the mean of each wait type
+    (NaN if the wait type never occurred) and, for monitored runs, the utilization
+    and time-average queue length of each resource (average number in service for
+    the unlimited authors)
+    """
+    collector = wait_times if isinstance(wait_times, WaitTimeCollector) else WaitTimeCollector.from_records(wait_times)
+    summary = {f"{outcome}_count": collector.count(outcome) for outcome in OUTCOMES}
+    summary["submissions"] = sum(summary[f"{outcome}_count"] for outcome in OUTCOMES)
+    summary["publish_rate"] = summary["published_count"] / summary["submissions"] if summary["submissions"] else np.nan
+    for wait_type in WAIT_TYPES:
+        summary[f"{wait_type}_mean"] = collector.statistics[wait_type].mean if collector.count(wait_type) else np.nan
+    if collector.monitor is not None:
+        for resource, usage in collector.monitor.summary().items():
+            if np.isfinite(usage['utilization']):
+                summary[f"{resource}_utilization"] = usage['utilization']
+                summary[f"{resource}_queue"] = usage['mean_queue']
+            else:
+                # Unlimited resource (authors): nobody waits, report how many are busy
+                summary[f"{resource}_in_service"] = usage['mean_in_service']
+    return summary
 
-def part4_des_pipeline():
+def run_replication(args):
+    """
+    Run and summarize one replication (module level so process pools can pickle it)
+    """
+    sim_time, params, seed, engine, monitor_interval = args
+    return summarize_replication(simulate(sim_time, seed=seed, engine=engine, monitor_interval=monitor_interval, **params))
+
+def map_jobs(func, jobs, n_jobs=None):
+    """
+    Run func over jobs, in a process pool when n_jobs > 1 (default: all cores)
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs <= 1 or len(jobs) < 2:
+        return [func(job) for job in jobs]
+    # Several jobs per task keep the inter-process overhead small for short replications
+    chunksize = max(1, len(jobs) // (n_jobs * 4))
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(func, jobs, chunksize=chunksize))
+
+def confidence_intervals(summaries, confidence=0.95):
+    """
+    Mean and Student t confidence interval of every summary value across replications
+
+    summaries is a list of per-replication summary dicts, or a dict of value name ->
+    array with one entry per replication
+
+    Returns:
+    - dict of value name -> {'mean', 'std', 'ci_low', 'ci_high', 'n'}; replications
+    where a value is NaN are left out of that value
+    """
+    if not isinstance(summaries, dict):
+        summaries = {name: [summary[name] for summary in summaries] for name in summaries[0]}
+    results = {}
+    for name in summaries:
+        values = np.array(summaries[name], dtype=float)
+        values = values[~np.isnan(values)]
+        n = len(values)
+        mean = values.mean() if n else np.nan
+        std = values.std(ddof=1) if n > 1 else np.nan
+        half_width = scipy_stats.t.ppf((1 + confidence) / 2, n - 1) * std / np.sqrt(n) if n > 1 else np.nan
+        results[name] = {'mean': mean, 'std': std, 'ci_low': mean - half_width, 'ci_high': mean + half_width, 'n': n}
+    return results
+
+def run_replications(num_replications=30, sim_time=365, submission_frequency=3, editors_capacity=2,
+                     seed=42, n_jobs=None, confidence=0.95, engine='simpy', monitor_interval=1, **parameters):
+    """
+    Run independent replications of the simulation in a process pool
+
+    Each replication gets its own random stream, spawned from one SeedSequence,
+    so results do not depend on n_jobs or on the order replications finish
+
+    Parameters:
+    - num_replications: number of replications
+    - sim_time, submission_frequency, editors_capacity: as in run_simulation
+    - seed: root seed for all replications (runs with the same seed see the same papers)
+    - n_jobs: number of worker processes (default: all cores; 1 runs in this process)
+    - confidence: confidence level of the intervals
+    - engine: simulation engine (see simulate)
+    - monitor_interval: days between resource samples (None = no monitoring)
+    - parameters: other model parameters (see DEFAULT_PARAMETERS)
+
+    Returns:
+    - dict with the per-replication summaries and their confidence intervals
+    """
+    params = model_parameters(submission_frequency=submission_frequency, editors_capacity=editors_capacity, **parameters)
+    seeds = np.random.SeedSequence(seed).spawn(num_replications)
+    summaries = map_jobs(run_replication, [(sim_time, params, child, engine, monitor_interval) for child in seeds], n_jobs)
+    return {'replications': summaries, 'intervals': confidence_intervals(summaries, confidence),
+            'confidence': confidence}
+
+def print_replication_results(results, sim_time=365):
+    """
+    Print the means and confidence intervals of a run_replications result
+    """
+    intervals = results['intervals']
+    level = f"{results['confidence']:.0%}"
+    print(f"{len(results['replications'])} replications of {sim_time} days (mean [{level} CI])")
+    for name in ["submissions", "published_count", "editor_reject_count", "peer_reviewer_reject_count", "publish_rate"]:
+        ci = intervals[name]
+        print(f"  {name}: {ci['mean']:.2f} [{ci['ci_low']:.2f}, {ci['ci_high']:.2f}]")
+    print("Wait time statistics (in days):")
+    for wait_type in WAIT_TYPES:
+        ci = intervals[f"{wait_type}_mean"]
+        print(f"  {wait_type}: {ci['mean']:.2f} [{ci['ci_low']:.2f}, {ci['ci_high']:.2f}] (average)")
+    resources = [name for name in intervals if name.endswith(('_utilization', '_queue', '_in_service'))]
+    if resources:
+        print("Resource usage (time average):")
+        for name in resources:
+            ci = intervals[name]
+            print(f"  {name}: {ci['mean']:.2f} [{ci['ci_low']:.2f}, {ci['ci_high']:.2f}]")
+
+def paired_replication(args):
+    """
+    Run and summarize one replication of two scenarios on the same random streams
+    (module level so process pools can pickle it)
+    """
+    sim_time, params_a, params_b, seed, engine = args
+    return (summarize_replication(simulate(sim_time, seed=seed, engine=engine, **params_a)),
+            summarize_replication(simulate(sim_time, seed=seed, engine=engine, **params_b)))
+
+def compare_scenarios(scenario_a, scenario_b, num_replications=30, sim_time=365, seed=42, n_jobs=None,
+                      confidence=0.95, engine='simpy'):
+    """
+    Compare two scenarios with common random numbers
+
+    Both scenarios of a replication use the same seed, so every paper has the same
+    random attributes in both (see RandomStreams), and the differences are estimated
+    from the paired per-replication differences
+
+    Parameters:
+    - scenario_a, scenario_b: dicts of model parameters (see DEFAULT_PARAMETERS)
+    - num_replications, sim_time, seed, n_jobs, confidence, engine: as in run_replications
+
+    Returns:
+    - dict with the per-replication summaries of both scenarios, the confidence
+    intervals of the paired differences (b - a), and for reference the interval
+    half-width of each difference from independent runs of both scenarios
+    """
+    params_a, params_b = model_parameters(**scenario_a), model_parameters(**scenario_b)
+    seeds = np.random.SeedSequence(seed).spawn(num_replications)
+    pairs = map_jobs(paired_replication, [(sim_time, params_a, params_b, child, engine) for child in seeds], n_jobs)
+    summaries_a, summaries_b = [a for a, _ in pairs], [b for _, b in pairs]
+    differences = [{name: b[name] - a[name] for name in a} for a, b in pairs]
+
+    # Independent runs have the same spread per scenario, but no covariance to cancel
+    intervals_a, intervals_b = confidence_intervals(summaries_a, confidence), confidence_intervals(summaries_b, confidence)
+    independent_half_width = {name: np.hypot(intervals_a[name]['ci_high'] - intervals_a[name]['mean'],
+                                             intervals_b[name]['ci_high'] - intervals_b[name]['mean'])
+                              for name in differences[0]}
+    return {'a': summaries_a, 'b': summaries_b, 'differences': confidence_intervals(differences, confidence),
+            'independent_half_width': independent_half_width, 'confidence': confidence}
+
+def print_comparison_results(results, names=("published_count", "publish_rate", "editor_wait_mean",
+                                             "peer_reviewer_wait_mean", "published_mean")):
+    """
+    Print the paired differences of a compare_scenarios result, with the number of
+    independent replications needed for the same precision
+    """
+    level = f"{results['confidence']:.0%}"
+    print(f"Paired differences over {len(results['a'])} replications (mean [{level} CI])")
+    for name in names:
+        ci = results['differences'][name]
+        paired_half_width = ci['ci_high'] - ci['mean']
+        line = f"  {name}: {ci['mean']:.2f} [{ci['ci_low']:.2f}, {ci['ci_high']:.2f}]"
+        if paired_half_width > 0:
+            factor = (results['independent_half_width'][name] / paired_half_width) ** 2
+            line += f" (independent runs need {factor:.1f}x the replications)"
+        print(line)
+
+def engine_replication(args):
+    """
+    Run one replication for compare_engines: wait type -> summary statistics
+    """
+    sim_time, params, seed, engine = args
+    return simulate(sim_time, seed=seed, engine=engine, **params).stats()
+
+def compare_engines(num_replications=30, sim_time=365, seed=42, n_jobs=None, **parameters):
+    """
+    Check that the heap engine reproduces the SimPy model in distribution
+
+    For every wait type, the count, mean, median and 90th percentile of each
+    replication are compared between the engines with a Welch t-test and a
+    two-sample Kolmogorov-Smirnov test. Replications are the independent
+    observations (wait times within one run are autocorrelated), and the engines
+    use different streams (spawned from seed and seed + 1)
+
+    Returns:
+    - dataframe with one row per compared value: both means and the p-values
+    """
+    params = model_parameters(**parameters)
+    values = {}
+    for k, engine in enumerate(ENGINES):
+        seeds = np.random.SeedSequence(seed + k).spawn(num_replications)
+        values[engine] = map_jobs(engine_replication, [(sim_time, params, child, engine) for child in seeds], n_jobs)
+
+    rows = []
+    for wait_type in WAIT_TYPES:
+        for statistic in ['count', 'mean', 'median', 'p90']:
+            a, b = [np.array([stats[wait_type][statistic] if wait_type in stats else np.nan for stats in values[engine]])
+                    for engine in ENGINES]
+            a, b = a[~np.isnan(a)], b[~np.isnan(b)]
+            if len(a) < 2 or len(b) < 2:
+                continue
+            rows.append({'value': f"{wait_type}_{statistic}", 'simpy_mean': a.mean(), 'heap_mean': b.mean(),
+                         't_pvalue': scipy_stats.ttest_ind(a, b, equal_var=False).pvalue,
+                         'ks_pvalue': scipy_stats.ks_2samp(a, b).pvalue})
+    return pd.DataFrame(rows)
+
+class CountingEnvironment(simpy.Environment):
+    """
+    SimPy environment that counts the events it processes
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events_processed = 0
+
+    def step(self):
+        self.events_processed += 1
+        super().step()
+
+def benchmark_engines(sim_time=36500, seed=42, **parameters):
+    """
+    Time one long run with each engine
+
+    Events are counted by each engine's own definition (SimPy also counts process
+    starts and resource requests/releases), so papers per second is the comparable
+    throughput
+
+    Returns:
+    - dataframe with one row per engine: seconds, papers, events and their rates
+    """
+    params = model_parameters(**parameters)
+    rows = []
+    for engine in ENGINES:
+        wait_times = WaitTimeCollector()
+        streams = RandomStreams(seed)
+        start = time.perf_counter()
+        if engine == 'heap':
+            events = run_heap_model(sim_time, params, streams, wait_times)
+        else:
+            env = CountingEnvironment()
+            run_simpy_model(env, sim_time, params, streams, wait_times)
+            events = env.events_processed
+        seconds = time.perf_counter() - start
+        papers = sum(wait_times.count(outcome) for outcome in OUTCOMES)
+        rows.append({'engine': engine, 'seconds': seconds, 'papers': papers, 'events': events,
+                     'papers_per_second': papers / seconds, 'events_per_second': events / seconds})
+    return pd.DataFrame(rows)
+
+def grid_design(**levels):
+    """
+    Full factorial design: every combination of the given parameter levels
+
+    Example: grid_design(editors_capacity=[2, 3], submission_frequency=[2, 3])
+
+    Returns:
+    - list of scenario dicts of parameter overrides
+    """
+    names = list(levels)
+    return [dict(zip(names, values)) for values in itertools.product(*(levels[name] for name in names))]
+
+def latin_hypercube_design(num_scenarios, ranges, seed=42):
+    """
+    Latin hypercube design over parameter ranges
+
+    Parameters:
+    - num_scenarios: number of scenarios
+    - ranges: dict of parameter name -> (low, high); integer parameters are drawn
+    uniformly from low..high inclusive
+    - seed: random seed of the design
+
+    Returns:
+    - list of scenario dicts of parameter overrides
+    """
+    names = list(ranges)
+    model_parameters(**dict.fromkeys(names, 0))  # check parameter names
+    sample = qmc.LatinHypercube(d=len(names), seed=seed).random(num_scenarios)
+    scenarios = []
+    for row in sample:
+        scenario = {}
+        for name, u in zip(names, row):
+            low, high = ranges[name]
+            if name in INTEGER_PARAMETERS:
+                scenario[name] = int(low + np.floor(u * (high - low + 1)))
+            else:
+                scenario[name] = float(low + u * (high - low))
+        scenarios.append(scenario)
+    return scenarios
+
+def run_sweep(scenarios, num_replications=10, sim_time=365, seed=42, n_jobs=None, output_path=None, engine='simpy',
+              monitor_interval=1):
+    """
+    Run num_replications replications of every scenario in one process pool
+
+    Replication r of every scenario uses the same spawned seed, so scenarios are
+    compared on the same random streams (the same papers, see RandomStreams)
+
+    Parameters:
+    - scenarios: list of parameter override dicts (grid_design, latin_hypercube_design)
+    - num_replications: replications per scenario
+    - sim_time: simulation time in terms of days
+    - seed: root seed
+    - n_jobs: number of worker processes (default: all cores)
+    - output_path: optional Parquet file for the results
+    - engine: simulation engine (see simulate); 'heap' makes large sweeps much cheaper
+    - monitor_interval: days between resource samples (None = no monitoring)
+
+    Returns:
+    - tidy dataframe with one row per scenario and replication: scenario id, all
+    model parameters, replication number and the replication summary
+    """
+    seeds = np.random.SeedSequence(seed).spawn(num_replications)
+    params = [model_parameters(**scenario) for scenario in scenarios]
+    jobs = [(sim_time, scenario_params, child, engine, monitor_interval) for scenario_params in params for child in seeds]
+    summaries = map_jobs(run_replication, jobs, n_jobs)
+
+    rows = []
+    for k, summary in enumerate(summaries):
+        scenario_id, replication = divmod(k, num_replications)
+        rows.append({'scenario': scenario_id, **params[scenario_id], 'replication': replication,
+                     'sim_time': sim_time, **summary})
+    results = pd.DataFrame(rows)
+    if output_path:
+        results.to_parquet(output_path, index=False)
+    return results
+
+def summarize_sweep(results, confidence=0.95):
+    """
+    Mean and confidence interval half-width of every summary value per scenario
+
+    Returns:
+    - dataframe with one row per scenario: its parameters, then <value>_mean and
+    <value>_ci columns
+    """
+    value_columns = [column for column in results.columns
+                     if column not in ['scenario', 'replication', 'sim_time'] + list(DEFAULT_PARAMETERS)]
+    rows = []
+    for scenario_id, group in results.groupby('scenario', sort=True):
+        intervals = confidence_intervals(group[value_columns].to_dict('records'), confidence)
+        row = {'scenario': scenario_id, **{name: group[name].iloc[0] for name in DEFAULT_PARAMETERS}}
+        for name, ci in intervals.items():
+            row[f"{name}_mean"] = ci['mean']
+            row[f"{name}_ci"] = ci['ci_high'] - ci['mean']
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def fcfs_waits(interarrival_times, service_times, servers):
+    """
+    Waiting times at a first-come-first-served queue with identical servers, for
+    many independent replications at once (one column per replication)
+
+    One server: Lindley recursion W[n] = max(0, W[n-1] + S[n-1] - T[n]) in closed
+    form, W = P - running min of P with P the cumulative sum of S[n-1] - T[n].
+    Several servers: Kiefer-Wolfowitz recursion on the sorted remaining work of the
+    servers, looping over papers but vectorized over replications
+
+    Parameters:
+    - interarrival_times: (papers, replications) time since the previous arrival
+    - service_times: (papers, replications) service time of each paper
+    - servers: number of servers
+
+    Returns:
+    - (papers, replications) array of waiting times
+    """
+    if servers == 1:
+        steps = np.zeros_like(service_times)
+        steps[1:] = service_times[:-1] - interarrival_times[1:]
+        cumulative = np.cumsum(steps, axis=0)
+        return cumulative - np.minimum.accumulate(cumulative, axis=0)
+
+    waits = np.empty_like(service_times)
+    if service_times.shape[1] < 32:
+        # Few long replications: numpy calls per paper cost more than a heap of server free times
+        for column in range(service_times.shape[1]):
+            free_times, now = [0.0] * servers, 0.0
+            for n, (interarrival, service) in enumerate(zip(interarrival_times[:, column].tolist(),
+                                                            service_times[:, column].tolist())):
+                now += interarrival
+                start = max(now, free_times[0])
+                waits[n, column] = start - now
+                heapq.heapreplace(free_times, start + service)
+        return waits
+
+    workload = np.zeros((servers, service_times.shape[1]))  # sorted remaining work per server
+    for n in range(len(service_times)):
+        np.maximum(workload - interarrival_times[n], 0, out=workload)
+        waits[n] = workload[0]
+        workload[0] += service_times[n]
+        # Only the first row is out of order: move it up to its place
+        for k in range(1, servers):
+            low = np.minimum(workload[k - 1], workload[k])
+            np.maximum(workload[k - 1], workload[k], out=workload[k])
+            workload[k - 1] = low
+    return waits
+
+def fast_estimate(num_replications=1000, sim_time=365, submission_frequency=3, editors_capacity=2,
+                  seed=42, confidence=0.95, **parameters):
+    """
+    Fast estimate of the editor and first peer review waits without an event loop
+
+    All interarrival, editor and review times are drawn up front as arrays and the
+    waits computed with fcfs_waits. The editor stage is exact (same distribution as
+    the simulation). The peer review stage leaves out the revision checks that share
+    the peer reviewers, so its waits are a lower bound of the simulated ones
+
+    Parameters: as in run_replications
+
+    Returns:
+    - dict with the per-replication summaries (dataframe with the count and mean of
+    editor_wait and peer_reviewer_wait) and their confidence intervals
+    """
+    params = model_parameters(submission_frequency=submission_frequency, editors_capacity=editors_capacity, **parameters)
+    rng = np.random.default_rng(seed)
+    # Enough papers to fill sim_time in practically every replication
+    expected = sim_time / params['submission_frequency']
+    shape = (int(expected + 6 * np.sqrt(expected) + 10), num_replications)
+
+    # Editor stage: Poisson submissions, exponential editor times
+    interarrival_times = rng.exponential(params['submission_frequency'], shape)
+    submission_times = np.cumsum(interarrival_times, axis=0)
+    editor_times = rng.exponential(5, shape)
+    editor_waits = fcfs_waits(interarrival_times, editor_times, int(params['editors_capacity']))
+    editor_done_times = submission_times + editor_waits + editor_times
+    accepted = rng.random(shape) >= params['editor_reject_prob']
+
+    # Peer review stage: papers in order of editor completion; rejected papers pass
+    # through with zero review time, which leaves the other papers' waits unchanged
+    order = np.argsort(editor_done_times, axis=0)
+    review_arrival_times = np.take_along_axis(editor_done_times, order, axis=0)
+    review_accepted = np.take_along_axis(accepted, order, axis=0)
+    review_times = np.where(review_accepted, rng.exponential(7, shape), 0)
+    review_waits = fcfs_waits(np.diff(review_arrival_times, axis=0, prepend=0), review_times,
+                              int(params['reviewers_capacity']))
+
+    # Keep the waits the simulation would record: those ending before sim_time
+    summaries = {}
+    for wait_type, waits, recorded in [
+            ('editor_wait', editor_waits, submission_times + editor_waits < sim_time),
+            ('peer_reviewer_wait', review_waits, review_accepted & (review_arrival_times + review_waits < sim_time))]:
+        counts = recorded.sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            summaries[f"{wait_type}_count"] = counts
+            summaries[f"{wait_type}_mean"] = np.where(recorded, waits, 0).sum(axis=0) / counts
+    return {'replications': pd.DataFrame(summaries), 'intervals': confidence_intervals(summaries, confidence),
+            'confidence': confidence}
+
+def check_fast_estimate(num_replications=30, sim_time=365, seed=42, n_jobs=None, confidence=0.95, **parameters):
+    """
+    Cross-check fast_estimate against the SimPy simulation
+
+    Returns:
+    - dataframe with one row per wait type: mean and confidence interval half-width
+    of the simulation and of the fast estimate
+    """
+    simulated = run_replications(num_replications, sim_time, seed=seed, n_jobs=n_jobs, confidence=confidence, **parameters)
+    estimated = fast_estimate(max(num_replications, 1000), sim_time, seed=seed, confidence=confidence, **parameters)
+    rows = []
+    for name in ['editor_wait_mean', 'peer_reviewer_wait_mean']:
+        row = {'value': name}
+        for label, results in [('simulation', simulated), ('fast', estimated)]:
+            ci = results['intervals'][name]
+            row[f"{label}_mean"] = ci['mean']
+            row[f"{label}_ci"] = ci['ci_high'] - ci['mean']
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def prune_scenarios(scenarios, max_wait, num_replications=500, sim_time=365, seed=42, confidence=0.95):
+    """
+    Drop sweep scenarios that cannot meet a target before simulating them
+
+    A scenario is dropped when the lower confidence bound of its fast estimated
+    editor plus first peer review wait is above max_wait. The fast estimate does not
+    overestimate these waits (see fast_estimate), so the full simulation would not
+    meet the target either
+
+    Returns:
+    - list of the kept scenarios
+    - dataframe with one row per scenario: its parameters, the estimated wait, its
+    lower bound and whether it was kept
+    """
+    rows = []
+    for scenario in scenarios:
+        estimate = fast_estimate(num_replications, sim_time, seed=seed, confidence=confidence, **scenario)
+        editor, review = estimate['intervals']['editor_wait_mean'], estimate['intervals']['peer_reviewer_wait_mean']
+        wait = editor['mean'] + review['mean']
+        # Half-width of the sum, treating the two stage means as independent
+        half_width = np.hypot(editor['ci_high'] - editor['mean'], review['ci_high'] - review['mean'])
+        rows.append({**model_parameters(**scenario), 'estimated_wait': wait, 'wait_low': wait - half_width,
+                     'kept': not wait - half_width > max_wait})
+    estimates = pd.DataFrame(rows)
+    kept = [scenario for scenario, keep in zip(scenarios, estimates['kept']) if keep]
+    return kept, estimates
+
+def part4_des_pipeline(num_replications=30):
     """
     Function to complete Part 4 DES completely
     """
     # Run the simulation
     run_simulation()
 
+    # Replications give the spread of the results across independent runs
+    print("\n--- Replications ---")
+    print_replication_results(run_replications(num_replications))
+
     # What-if scenario: More editors available
     print("\n--- What-if Scenario: More Available Editors ---")
     # Increase number of editors from 2 to 3
     run_simulation(editors_capacity=3)
+    print()
+    print_replication_results(run_replications(num_replications, editors_capacity=3))
+    # Same papers in both scenarios (common random numbers): paired differences
+    print()
+    print_comparison_results(compare_scenarios({'editors_capacity': 2}, {'editors_capacity': 3}, num_replications))
+
+    # Steady state: warm-up cut with MSER-5 and batch means over one 100-year run
+    print("\n--- Steady State (one long run) ---")
+    print(run_steady_state()[['wait_type', 'warmup', 'raw_mean', 'mean', 'ci_low', 'ci_high', 'lag1']].round(2).to_string(index=False))
+
+    # What-if sweep: editors and peer reviewers available, at two submission rates
+    print("\n--- What-if Sweep: Editors x Peer Reviewers x Submission Frequency ---")
+    scenarios = grid_design(editors_capacity=[1, 2, 3], reviewers_capacity=[3, 5], submission_frequency=[2, 3])
+    # Skip scenarios whose fast estimated editor and review waits are above 30 days
+    scenarios, estimates = prune_scenarios(scenarios, max_wait=30)
+    print(f"Pruned {len(estimates) - len(scenarios)} of {len(estimates)} scenarios with the fast estimate")
+    results = run_sweep(scenarios, num_replications, output_path=os.path.join(script_dir, "des_sweep_results.parquet"))
+    summary = summarize_sweep(results)
+    print(summary[['editors_capacity', 'reviewers_capacity', 'submission_frequency',
+                   'published_mean_mean', 'published_mean_ci', 'publish_rate_mean',
+                   'editors_utilization_mean', 'peer_reviewers_utilization_mean']].round(2).to_string(index=False))
+
+    # Specialized heap engine: same model in distribution, fewer and cheaper events
+    print("\n--- Simulation Engines ---")
+    print(benchmark_engines().round(2).to_string(index=False))
+
+def test_engines_match():
+    print("\nTesting the heap engine against the SimPy model...")
+    for seed in [1, 2]:
+        # Large reservoirs keep every wait time in recording order
+        results = {engine: simulate(365, seed=seed, engine=engine, reservoir_size=10 ** 6, monitor_interval=1)
+                   for engine in ENGINES}
+        simpy_run, heap_run = results['simpy'], results['heap']
+        for wait_type in WAIT_TYPES:
+            assert simpy_run.count(wait_type) == heap_run.count(wait_type) > 0
+            assert simpy_run.sample(wait_type) == heap_run.sample(wait_type)
+        assert simpy_run.monitor.samples == heap_run.monitor.samples == 365
+        assert np.array_equal(simpy_run.monitor.queue, heap_run.monitor.queue)
+        assert np.array_equal(simpy_run.monitor.in_service, heap_run.monitor.in_service)
+    print("Engine tests passed!")
+
+def test_random_streams():
+    print("\nTesting RandomStreams...")
+    # Same paper attributes whatever max_revisions is (common random numbers)
+    streams_a, streams_b = RandomStreams(7), RandomStreams(7)
+    for _ in range(1000):
+        paper_a = streams_a.paper(model_parameters(max_revisions=3))
+        paper_b = streams_b.paper(model_parameters(max_revisions=1))
+        assert paper_a == paper_b
+    assert len(paper_a.revision_times) == MAX_REVISION_ROUNDS
+    try:
+        model_parameters(max_revisions=MAX_REVISION_ROUNDS + 1)
+        assert False, "max_revisions above MAX_REVISION_ROUNDS was accepted"
+    except ValueError:
+        pass
+    print("RandomStreams tests passed!")
+
+def test_p2_quantile():
+    print("\nTesting P2Quantile...")
+    values = np.random.default_rng(0).exponential(7, 20000)
+    for p in [0.5, 0.9, 0.95]:
+        estimator = P2Quantile(p)
+        for x in values.tolist():
+            estimator.add(x)
+        assert abs(estimator.value() - np.quantile(values, p)) < 0.02 * np.quantile(values, p)
+
+    # Exact until the markers are placed
+    estimator = P2Quantile(0.9)
+    for x in values[:50].tolist():
+        estimator.add(x)
+    assert estimator.value() == np.quantile(values[:50], 0.9)
+    assert np.isnan(P2Quantile(0.5).value())
+    print("P2Quantile tests passed!")
+
+def test_fcfs_waits():
+    print("\nTesting fcfs_waits...")
+    rng = np.random.default_rng(1)
+    interarrival_times = rng.exponential(3, (300, 40))
+    service_times = rng.exponential(5, (300, 40))
+
+    # One server: naive Lindley loop per replication
+    waits = fcfs_waits(interarrival_times, service_times, 1)
+    expected = np.zeros_like(waits)
+    for column in range(waits.shape[1]):
+        for n in range(1, len(waits)):
+            expected[n, column] = max(0.0, expected[n - 1, column] + service_times[n - 1, column]
+                                      - interarrival_times[n, column])
+    assert np.allclose(waits, expected)
+
+    # Several servers: the vectorized and the per-replication paths agree
+    waits = fcfs_waits(interarrival_times, service_times, 2)
+    assert np.allclose(waits[:, :10], fcfs_waits(interarrival_times[:, :10], service_times[:, :10], 2))
+    assert (waits >= 0).all() and (waits <= expected + 1e-9).all()  # never worse than one server
+    print("fcfs_waits tests passed!")
+
+def test_batch_series():
+    print("\nTesting BatchSeries...")
+    rng = np.random.default_rng(2)
+    # Stationary noise after a 500 value warm-up that decays from 20 to 0
+    values = rng.normal(0, 1, 5000)
+    values[:500] += np.linspace(20, 0, 500)
+    series = BatchSeries()
+    for x in values.tolist():
+        series.add(x)
+    result = series.steady_state()
+    assert 400 <= result['warmup'] <= 600
+    assert result['ci_low'] < 0 < result['ci_high']
+
+    # Merged batches: the batch size doubles and the means stay the overall mean
+    series = BatchSeries(batch_size=5, max_batches=8)
+    for x in range(100):
+        series.add(float(x))
+    assert series.batch_size == 20 and len(series.means) <= 8
+    assert series.means[0] == np.mean(range(20))
+    print("BatchSeries tests passed!")
+
+def test_resource_monitor():
+    print("\nTesting ResourceMonitor...")
+    # Busy system (papers arrive every day) so the editors are saturated
+    for engine in ENGINES:
+        monitor = simulate(365, submission_frequency=1, seed=3, engine=engine, monitor_interval=0.5).monitor
+        summary = monitor.summary()
+        for resource in ['editors', 'peer_reviewers']:
+            assert 0 <= summary[resource]['utilization'] <= 1
+        assert summary['editors']['utilization'] > 0.9
+        assert np.isnan(summary['authors']['utilization'])
+        frame = monitor.to_frame()
+        utilization = frame.loc[frame['resource'] != 'authors', 'utilization']
+        assert len(frame) == 3 * 730 and utilization.between(0, 1).all()
+    print("ResourceMonitor tests passed!")
+
+def run_all_tests():
+    print("Starting all tests...\n")
+
+    # Run all test functions
+    test_engines_match()
+    test_random_streams()
+    test_p2_quantile()
+    test_fcfs_waits()
+    test_batch_series()
+    test_resource_monitor()
+
+    print("\nAll tests passed!")
 
 if __name__ == "__main__":
-    part4_des_pipeline()
\ No newline at end of file
+    run_all_tests()
+
+    part4_des_pipeline()
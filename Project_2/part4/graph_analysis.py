@@ -7,15 +7,35 @@ Original file is located at
     https://colab.research.google.com/drive/1c9dXbGVvZtuFFsfXWh41Pd3d8j_3Cs8I
 """
 
+import numpy as np
 import pandas as pd
 import networkx as nx
 from ast import literal_eval
 from collections import defaultdict, Counter
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 from community import community_louvain
+import pyarrow.parquet as pq
+from scipy import sparse
 import re
-import itertools
 import os
+from concurrent.futures import ProcessPoolExecutor
+import random
+from contextlib import contextmanager
+import hashlib
+import json
+import sys
+
+# Part 3 owns the hand-off format (write_handoff / handoff_parquet_file)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "part3"))
+from data_processing import handoff_parquet_file
+
+# Optional compiled graph library for calculate_network_metrics(backend='igraph')
+try:
+    import igraph
+except ImportError:
+    igraph = None
 
 def clean_author_name(author_str):
     """Clean individual author names by removing extra characters and normalizing."""
@@ -41,17 +61,43 @@ def process_authors_field(authors_str):
 
     return []
 
+def clean_author_lists(authors):
+    """Clean a column of author lists in one vectorized pass, without parsing each row."""
+    exploded = authors.explode().dropna()
+    cleaned = exploded.str.replace(r'[\{\}\'"]', '', regex=True).str.strip()
+    cleaned = cleaned.str.replace(r'\b([A-Z])\.\s*', r'\1 ', regex=True)
+    grouped = cleaned.groupby(level=0).agg(list).reindex(authors.index)
+    return grouped.apply(lambda x: x if isinstance(x, list) else [])
+
+def load_handoff(full_path):
+    """Load a Part 3 hand-off file, preferring the typed Parquet copy while it matches the CSV."""
+    parquet_path = handoff_parquet_file(full_path)
+    if parquet_path is None:
+        return pd.read_csv(full_path), False
+
+    table = pq.read_table(parquet_path)
+    df = table.to_pandas()
+    # list<string> column comes straight from arrow as python lists
+    df['authors'] = pd.Series(table.column('authors').to_pylist(), index=df.index, dtype=object)
+    return df, True
+
+def handoff_path(filepath):
+    """Path of a Part 3 hand-off file given its file name."""
+    return os.path.join("part3", filepath).replace("\\", "/")
+
 def load_and_preprocess_data(filepath):
     """Load and preprocess the research outputs dataset."""
-    full_path = os.path.join("part3", filepath)
-    full_path = full_path.replace("\\", "/")
-    df = pd.read_csv(full_path)
+    full_path = handoff_path(filepath)
+    df, typed = load_handoff(full_path)
 
     # Remove duplicate titles (keeping the first occurrence)
     df = df.drop_duplicates(subset=['title'], keep='first')
 
-    # Process authors field
-    df['authors'] = df['authors'].apply(process_authors_field)
+    # Process authors field (already a list in the Parquet hand-off)
+    if typed:
+        df['authors'] = clean_author_lists(df['authors'])
+    else:
+        df['authors'] = df['authors'].apply(process_authors_field)
 
     # Matched datasets
     df['matched_datasets'] = df['matched_dataset_terms'].str.split('; ') if 'matched_dataset_terms' in df.columns else [[] for _ in range(len(df))]
@@ -73,66 +119,847 @@ def load_and_preprocess_data(filepath):
 
     return df
 
-def construct_research_graph(df):
-    """Construct a graph where nodes are research outputs and edges represent shared attributes."""
-    G = nx.Graph()
+# Edge attributes and the node attribute each one counts shared values of
+EDGE_ATTRIBUTES = ['shared_authors', 'shared_datasets', 'shared_topics', 'shared_affiliations', 'same_location']
+EDGE_ATTRIBUTE_SOURCES = {
+    'shared_authors': 'authors',
+    'shared_datasets': 'datasets',
+    'shared_topics': 'topics',
+    'shared_affiliations': 'affiliations',
+    'same_location': 'location',
+}
+
+def build_posting_lists(values_per_output):
+    """Map each attribute value to the sorted array of output positions that have it."""
+    postings = defaultdict(list)
+    for position, values in enumerate(values_per_output):
+        for value in values:
+            postings[value].append(position)
+    return [np.array(positions, dtype=np.int64) for positions in postings.values() if len(positions) > 1]
+
+def family_pair_counts_posting(values_per_output, num_outputs):
+    """Count shared values for every pair of outputs that co-occurs in some posting list.
+
+    Pairs are encoded as src * num_outputs + dst (src < dst). Returns the sorted pair keys
+    and the number of values each pair shares.
+    """
+    pair_keys = []
+    for positions in build_posting_lists(values_per_output):
+        src, dst = np.triu_indices(len(positions), k=1)
+        pair_keys.append(positions[src] * num_outputs + positions[dst])
+    if not pair_keys:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(pair_keys), return_counts=True)
+
+def incidence_matrix(values_per_output):
+    """Build the outputs x attribute-values CSR incidence matrix (1 where an output has a value)."""
+    value_ids = {}
+    rows, cols = [], []
+    for position, values in enumerate(values_per_output):
+        for value in values:
+            rows.append(position)
+            cols.append(value_ids.setdefault(value, len(value_ids)))
+    data = np.ones(len(rows), dtype=np.int64)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(values_per_output), len(value_ids)))
+
+def family_pair_counts_sparse(values_per_output, num_outputs):
+    """Count shared values for every pair of outputs as the upper triangle of B @ B.T.
+
+    Same return format as family_pair_counts_posting: sorted pair keys and counts.
+    """
+    B = incidence_matrix(values_per_output)
+    shared = sparse.triu(B @ B.T, k=1).tocoo()
+    keys = shared.row.astype(np.int64) * num_outputs + shared.col
+    order = np.argsort(keys)
+    return keys[order], shared.data[order].astype(np.int64)
+
+def merge_edge_families(family_counts, num_outputs):
+    """Merge per-attribute pair counts into one edge list with a column per edge attribute."""
+    keys = np.unique(np.concatenate([family_counts[name][0] for name in EDGE_ATTRIBUTES]))
+    edges = {'src': keys // num_outputs, 'dst': keys % num_outputs}
+    edges['weight'] = np.zeros(len(keys), dtype=np.int64)
+    for name in EDGE_ATTRIBUTES:
+        family_keys, counts = family_counts[name]
+        edges[name] = np.zeros(len(keys), dtype=np.int64)
+        edges[name][np.searchsorted(keys, family_keys)] = counts
+        edges['weight'] += edges[name]
+    return edges
+
+def output_attribute_values(output_attributes, name):
+    """Distinct values of one node attribute for every output, in node order."""
+    if name == 'location':
+        return [() if attrs['location'] is None else (attrs['location'],) for attrs in output_attributes.values()]
+    return [set(attrs[name]) for attrs in output_attributes.values()]
+
+# Ways to count shared attribute values for all pairs of outputs
+EDGE_BACKENDS = {
+    'posting': family_pair_counts_posting,
+    'sparse': family_pair_counts_sparse,
+}
+
+def compute_edge_arrays(output_attributes, backend='posting'):
+    """Compute the weighted edge list as COO arrays.
+
+    backend='posting' enumerates pairs inside attribute -> outputs posting lists,
+    backend='sparse' multiplies one scipy.sparse incidence matrix per attribute family
+    by its transpose. Either way only pairs that share at least one author, dataset,
+    topic, affiliation or location are kept. Returns arrays of src/dst node positions
+    (src < dst, sorted), the total weight and one count array per edge attribute.
+    """
+    if backend not in EDGE_BACKENDS:
+        raise ValueError(f"Unknown edge backend '{backend}', expected one of {list(EDGE_BACKENDS)}")
+    family_pair_counts = EDGE_BACKENDS[backend]
+    num_outputs = len(output_attributes)
+    family_counts = {
+        name: family_pair_counts(output_attribute_values(output_attributes, source), num_outputs)
+        for name, source in EDGE_ATTRIBUTE_SOURCES.items()
+    }
+    return merge_edge_families(family_counts, num_outputs)
+
+def top_k_edge_mask(edges, num_outputs, k):
+    """Mark the edges that are among the k heaviest edges of at least one endpoint.
+
+    Each node's incident edges are grouped into a candidate list and only lists longer
+    than k are partially sorted (np.argpartition). Ties go to the earlier edge.
+    """
+    num_edges = len(edges['src'])
+    keep = np.zeros(num_edges, dtype=bool)
+    if num_edges == 0:
+        return keep
+    edge_ids = np.arange(num_edges)
+    # Larger key = heavier edge, then earlier edge
+    keys = edges['weight'].astype(np.int64) * (num_edges + 1) + (num_edges - edge_ids)
+    endpoints = np.concatenate([edges['src'], edges['dst']])
+    incident = np.concatenate([edge_ids, edge_ids])
+    order = np.argsort(endpoints, kind='stable')
+    incident = incident[order]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(endpoints, minlength=num_outputs))])
+    degrees = np.diff(indptr)
+    keep[incident[np.repeat(degrees <= k, degrees)]] = True
+    for node in np.flatnonzero(degrees > k):
+        candidates = incident[indptr[node]:indptr[node + 1]]
+        keep[candidates[np.argpartition(-keys[candidates], k - 1)[:k]]] = True
+    return keep
+
+def sparsify_edges(edges, num_outputs, min_weight=None, min_shared=None, top_k=None):
+    """Drop weak edges before the graph is built.
+
+    min_weight keeps edges whose total weight is at least that value, min_shared maps edge
+    attributes to their minimum count (e.g. {'shared_authors': 1}), and top_k then keeps
+    each node's k strongest remaining neighbors (an edge stays if either endpoint ranks it).
+    """
+    keep = np.ones(len(edges['src']), dtype=bool)
+    if min_weight is not None:
+        keep &= edges['weight'] >= min_weight
+    for name, minimum in (min_shared or {}).items():
+        if name not in EDGE_ATTRIBUTES:
+            raise ValueError(f"Unknown edge attribute '{name}', expected one of {EDGE_ATTRIBUTES}")
+        keep &= edges[name] >= minimum
+    edges = {name: values[keep] for name, values in edges.items()}
+    if top_k is not None:
+        keep = top_k_edge_mask(edges, num_outputs, top_k)
+        edges = {name: values[keep] for name, values in edges.items()}
+    return edges
+
+def component_arrays(num_nodes, src, dst):
+    """Connected components of an edge list with an array union-find (union by size, path halving).
+
+    Returns the component id of every node (numbered by first node, like
+    nx.connected_components) and the size of every component.
+    """
+    parent = list(range(num_nodes))
+    size = [1] * num_nodes
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for u, v in zip(src.tolist(), dst.tolist()):
+        root_u, root_v = find(u), find(v)
+        if root_u != root_v:
+            if size[root_u] < size[root_v]:
+                root_u, root_v = root_v, root_u
+            parent[root_v] = root_u
+            size[root_u] += size[root_v]
+
+    roots = np.array([find(node) for node in range(num_nodes)], dtype=np.int64)
+    _, first, component_ids = np.unique(roots, return_index=True, return_inverse=True)
+    component_ids = np.argsort(np.argsort(first))[component_ids]
+    return component_ids, np.bincount(component_ids, minlength=len(first))
+
+def cached_component_sizes(G):
+    """Component sizes stored by construct_research_graph, or None when G no longer matches them.
+
+    The arrays are stamped with the node and edge counts they were computed for; a
+    subgraph view or a mutated graph changes the counts, so callers recompute instead.
+    """
+    if G.graph.get('component_counts') != (G.number_of_nodes(), G.number_of_edges()):
+        return None
+    return G.graph.get('component_sizes')
+
+# Packed edge record: node positions plus the shared attribute counts (17 bytes per edge)
+EDGE_DTYPE = np.dtype([('src', np.int32), ('dst', np.int32),
+                       ('shared_authors', np.uint16), ('shared_datasets', np.uint16),
+                       ('shared_topics', np.uint16), ('shared_affiliations', np.uint16),
+                       ('same_location', np.uint8)])
+LIST_ATTRIBUTES = ['authors', 'datasets', 'topics', 'affiliations']
+
+class CompactResearchGraph:
+    """Array-backed research output graph.
+
+    Edges live in one NumPy structured array (EDGE_DTYPE) and node attribute values
+    are interned: each list attribute is stored as integer ids into a shared vocabulary
+    (CSR layout), and location as one id per node. The view methods (nodes, edges,
+    number_of_nodes, subgraph, to_networkx) cover what the analysis code needs from a
+    networkx graph; subgraph/to_networkx materialize a real nx.Graph for the selected nodes.
+    component_ids/component_sizes hold the connected components (component_arrays).
+    """
+
+    def __init__(self, output_attributes, edges):
+        self.node_ids = list(output_attributes.keys())
+        self.position = {node: i for i, node in enumerate(self.node_ids)}
+        self.titles = [attrs['title'] for attrs in output_attributes.values()]
+        self.years = [attrs['year'] for attrs in output_attributes.values()]
+        self.node_values = {}
+
+        # Intern list attributes: vocabulary plus CSR (indptr, ids) per attribute
+        self.vocabulary = {}
+        self.attribute_indptr = {}
+        self.attribute_ids = {}
+        for name in LIST_ATTRIBUTES:
+            value_ids = {}
+            lengths = [len(attrs[name]) for attrs in output_attributes.values()]
+            ids = [value_ids.setdefault(value, len(value_ids))
+                   for attrs in output_attributes.values() for value in attrs[name]]
+            self.vocabulary[name] = list(value_ids)
+            self.attribute_indptr[name] = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+            self.attribute_ids[name] = np.array(ids, dtype=np.int32)
+
+        location_ids = {}
+        self.location_ids = np.array([-1 if attrs['location'] is None else location_ids.setdefault(attrs['location'], len(location_ids))
+                                      for attrs in output_attributes.values()], dtype=np.int32)
+        self.vocabulary['location'] = list(location_ids)
+
+        self.edge_store = np.empty(len(edges['src']), dtype=EDGE_DTYPE)
+        for name in EDGE_DTYPE.names:
+            self.edge_store[name] = edges[name]
+        self.component_ids, self.component_sizes = component_arrays(len(self.node_ids), edges['src'], edges['dst'])
+
+    @property
+    def edge_weights(self):
+        """Total weight of every edge (sum of the shared attribute counts)."""
+        return sum(self.edge_store[name].astype(np.int64) for name in EDGE_ATTRIBUTES)
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        return len(self.edge_store)
+
+    def nodes(self, data=False):
+        """Node ids, or (node, attributes) / (node, attribute value) pairs like nx.Graph.nodes."""
+        if data is False:
+            return list(self.node_ids)
+        if data is True:
+            return [(node, self.node_attributes(node)) for node in self.node_ids]
+        return [(node, self.node_attributes(node).get(data)) for node in self.node_ids]
+
+    def node_attributes(self, node):
+        """Attribute dict of one node, in the same form as construct_research_graph node data."""
+        i = self.position[node]
+        attributes = {'type': 'output', 'title': self.titles[i], 'year': self.years[i]}
+        for name in LIST_ATTRIBUTES:
+            ids = self.attribute_ids[name][self.attribute_indptr[name][i]:self.attribute_indptr[name][i + 1]]
+            attributes[name] = [self.vocabulary[name][value_id] for value_id in ids]
+        location_id = self.location_ids[i]
+        attributes['location'] = None if location_id < 0 else self.vocabulary['location'][location_id]
+        for name, values in self.node_values.items():
+            if node in values:
+                attributes[name] = values[node]
+        return attributes
+
+    def set_node_attributes(self, values, name):
+        """Attach an extra per-node attribute (e.g. community) given as a node -> value dict."""
+        self.node_values[name] = dict(values)
+
+    def edges(self, data=False):
+        """Iterate over edges as (u, v) or (u, v, attribute dict) like nx.Graph.edges."""
+        weights = self.edge_weights.tolist()
+        for k, record in enumerate(self.edge_store.tolist()):
+            u, v = self.node_ids[record[0]], self.node_ids[record[1]]
+            if data:
+                yield u, v, dict(zip(EDGE_ATTRIBUTES, record[2:]), weight=weights[k])
+            else:
+                yield u, v
+
+    def to_networkx(self, nodes=None):
+        """Materialize an nx.Graph with all nodes, or only the given nodes and the edges between them."""
+        selected = np.ones(len(self.node_ids), dtype=bool)
+        if nodes is not None:
+            selected[:] = False
+            selected[[self.position[node] for node in nodes]] = True
+        G = nx.Graph()
+        for i in np.flatnonzero(selected).tolist():
+            G.add_node(self.node_ids[i], **self.node_attributes(self.node_ids[i]))
+        keep = selected[self.edge_store['src']] & selected[self.edge_store['dst']]
+        weights = self.edge_weights[keep].tolist()
+        for k, record in enumerate(self.edge_store[keep].tolist()):
+            G.add_edge(self.node_ids[record[0]], self.node_ids[record[1]],
+                       weight=weights[k], **dict(zip(EDGE_ATTRIBUTES, record[2:])))
+        return G
+
+    def subgraph(self, nodes):
+        return self.to_networkx(nodes)
+
+def output_node_attributes(row):
+    """Node attributes of one preprocessed research output row."""
+    return {
+        'type': 'output',
+        'title': str(row['title']) if pd.notnull(row['title']) else "Untitled",
+        'year': row['year'] if pd.notnull(row['year']) else None,
+        'authors': row['authors'],
+        'datasets': row['matched_datasets'] if isinstance(row['matched_datasets'], list) else [],
+        'topics': row['topics'] if isinstance(row['topics'], list) else [],
+        'affiliations': row['affiliations'] if isinstance(row['affiliations'], list) else [],
+        'location': row['location'] if pd.notnull(row['location']) else None
+    }
 
+def construct_research_graph(df, backend='posting', compact=False, min_weight=None, min_shared=None, top_k=None):
+    """Construct a graph where nodes are research outputs and edges represent shared attributes.
+
+    backend selects how edges are generated ('posting' lists or 'sparse' matrix products).
+    compact=True returns a CompactResearchGraph (array-backed) instead of an nx.Graph.
+    min_weight, min_shared and top_k sparsify the edges (see sparsify_edges); by default
+    every pair sharing an attribute is connected.
+    """
     # Dictionary to store attributes for each output
     output_attributes = defaultdict(dict)
 
-    # First pass: add all output with their attributes
+    # First pass: collect all output with their attributes
     for _, row in df.iterrows():
         output_id = row['output_id']
 
         if pd.isna(output_id):
             continue
 
-        # Add output node with attributes
-        attributes = {
-            'type': 'output',
-            'title': str(row['title']) if pd.notnull(row['title']) else "Untitled",
-            'year': row['year'] if pd.notnull(row['year']) else None,
-            'authors': row['authors'],
-            'datasets': row['matched_datasets'] if isinstance(row['matched_datasets'], list) else [],
-            'topics': row['topics'] if isinstance(row['topics'], list) else [],
-            'affiliations': row['affiliations'] if isinstance(row['affiliations'], list) else [],
-            'location': row['location'] if pd.notnull(row['location']) else None
-        }
+        output_attributes[output_id] = output_node_attributes(row)
+
+    # Second pass: create edges based on shared attributes
+    edges = compute_edge_arrays(output_attributes, backend)
+    if min_weight is not None or min_shared or top_k is not None:
+        edges = sparsify_edges(edges, len(output_attributes), min_weight, min_shared, top_k)
+    if compact:
+        return CompactResearchGraph(output_attributes, edges)
 
+    G = nx.Graph()
+    # Components come from a union-find over the generated edges, aligned with the node order
+    G.graph['component_ids'], G.graph['component_sizes'] = component_arrays(len(output_attributes), edges['src'], edges['dst'])
+    for output_id, attributes in output_attributes.items():
         G.add_node(output_id, **attributes)
-        output_attributes[output_id] = attributes
+    node_ids = list(output_attributes.keys())
+    for i, j, weight, *shared_counts in zip(edges['src'].tolist(), edges['dst'].tolist(), edges['weight'].tolist(),
+                                            *(edges[name].tolist() for name in EDGE_ATTRIBUTES)):
+        G.add_edge(node_ids[i], node_ids[j], weight=weight, **dict(zip(EDGE_ATTRIBUTES, shared_counts)))
+    G.graph['component_counts'] = (G.number_of_nodes(), G.number_of_edges())
 
-    # Second pass: create edges based on shared attributes
-    for output1, output2 in itertools.combinations(output_attributes.keys(), 2):
-        attrs1 = output_attributes[output1]
-        attrs2 = output_attributes[output2]
+    return G
 
-        shared_attributes = {
-            'shared_authors': len(set(attrs1['authors']) & set(attrs2['authors'])),
-            'shared_datasets': len(set(attrs1['datasets']) & set(attrs2['datasets'])),
-            'shared_topics': len(set(attrs1['topics']) & set(attrs2['topics'])),
-            'shared_affiliations': len(set(attrs1['affiliations']) & set(attrs2['affiliations'])),
-            'same_location': 1 if attrs1['location'] == attrs2['location'] and attrs1['location'] is not None else 0
-        }
+class UnionFind:
+    """Disjoint sets over node ids (union by size, path halving) that also track members.
+
+    Keeping each root's member set lets a removal re-split only the affected component.
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.members = {}
+
+    def add(self, node):
+        self.parent[node] = node
+        self.members[node] = {node}
+
+    def find(self, node):
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, u, v):
+        root_u, root_v = self.find(u), self.find(v)
+        if root_u == root_v:
+            return root_u
+        if len(self.members[root_u]) < len(self.members[root_v]):
+            root_u, root_v = root_v, root_u
+        self.parent[root_v] = root_u
+        self.members[root_u] |= self.members.pop(root_v)
+        return root_u
+
+    def component(self, node):
+        return self.members[self.find(node)]
+
+    def num_components(self):
+        return len(self.members)
+
+class IncrementalResearchGraph:
+    """Keep a research output graph up to date as outputs are inserted, updated or removed.
+
+    Wraps an nx.Graph built by construct_research_graph. Attribute posting lists
+    (value -> output ids) give the edges of a changed output directly, so each change
+    costs time proportional to the outputs it shares values with. Node degrees and
+    connected components (union-find) are maintained alongside the graph.
+    """
+
+    def __init__(self, G=None):
+        self.G = G if G is not None else nx.Graph()
+        # The graph changes from here on, so construction-time component arrays go stale
+        self.G.graph.pop('component_ids', None)
+        self.G.graph.pop('component_sizes', None)
+        self.G.graph.pop('component_counts', None)
+        self.postings = {name: defaultdict(set) for name in EDGE_ATTRIBUTES}
+        self.components = UnionFind()
+        for node, attributes in self.G.nodes(data=True):
+            self._index(node, attributes)
+            self.components.add(node)
+        for u, v in self.G.edges():
+            self.components.union(u, v)
+
+    @staticmethod
+    def _family_values(attributes, name):
+        source = EDGE_ATTRIBUTE_SOURCES[name]
+        if source == 'location':
+            return () if attributes['location'] is None else (attributes['location'],)
+        return set(attributes[source])
+
+    def _index(self, node, attributes):
+        for name in EDGE_ATTRIBUTES:
+            for value in self._family_values(attributes, name):
+                self.postings[name][value].add(node)
+
+    def _unindex(self, node, attributes):
+        for name in EDGE_ATTRIBUTES:
+            for value in self._family_values(attributes, name):
+                holders = self.postings[name][value]
+                holders.discard(node)
+                if not holders:
+                    del self.postings[name][value]
+
+    def delta_edges(self, node, attributes):
+        """Edge attribute dicts between a (new) output and the indexed outputs it shares values with."""
+        shared = defaultdict(lambda: dict.fromkeys(EDGE_ATTRIBUTES, 0))
+        for name in EDGE_ATTRIBUTES:
+            for value in self._family_values(attributes, name):
+                for other in self.postings[name].get(value, ()):
+                    if other != node:
+                        shared[other][name] += 1
+        for counts in shared.values():
+            counts['weight'] = sum(counts[name] for name in EDGE_ATTRIBUTES)
+        return shared
+
+    def insert_output(self, output_id, attributes):
+        """Add an output, or update it if it is already in the graph."""
+        if output_id in self.G:
+            self.remove_output(output_id)
+        self.G.add_node(output_id, **attributes)
+        self.components.add(output_id)
+        for other, edge_data in self.delta_edges(output_id, attributes).items():
+            self.G.add_edge(output_id, other, **edge_data)
+            self.components.union(output_id, other)
+        self._index(output_id, attributes)
+
+    update_output = insert_output
+
+    def remove_output(self, output_id):
+        """Remove an output and its edges, re-splitting only the component it was in."""
+        attributes = self.G.nodes[output_id]
+        self._unindex(output_id, attributes)
+        component = self.components.members.pop(self.components.find(output_id))
+        self.G.remove_node(output_id)
+        del self.components.parent[output_id]
+        component.discard(output_id)
+        for node in component:
+            self.components.add(node)
+        for node in component:
+            for neighbor in self.G.neighbors(node):
+                self.components.union(node, neighbor)
+
+    def apply(self, df, removed_ids=()):
+        """Apply a refresh: upsert the preprocessed rows of df whose attributes changed, then remove removed_ids.
+
+        Returns the number of inserted/updated and removed outputs.
+        """
+        changed = 0
+        for _, row in df.iterrows():
+            output_id = row['output_id']
+            if pd.isna(output_id):
+                continue
+            attributes = output_node_attributes(row)
+            if output_id in self.G and all(self.G.nodes[output_id].get(key) == value for key, value in attributes.items()):
+                continue
+            self.insert_output(output_id, attributes)
+            changed += 1
+        removed = 0
+        for output_id in removed_ids:
+            if output_id in self.G:
+                self.remove_output(output_id)
+                removed += 1
+        return changed, removed
+
+    def degree_centrality(self):
+        """Degree centrality from the maintained node degrees (matches nx.degree_centrality)."""
+        n = self.G.number_of_nodes()
+        if n <= 1:
+            return {node: 1.0 for node in self.G}
+        return {node: degree / (n - 1) for node, degree in self.G.degree()}
+
+    def num_connected_components(self):
+        return self.components.num_components()
+
+    def component_sizes(self):
+        return Counter({root: len(members) for root, members in self.components.members.items()})
+
+def num_pivots(num_nodes, epsilon, delta):
+    """Number of sampled sources so each estimate is within epsilon with probability 1 - delta (Hoeffding bound)."""
+    if num_nodes == 0:
+        return 0
+    return min(num_nodes, int(np.ceil(np.log(2 * num_nodes / delta) / (2 * epsilon ** 2))))
+
+def _betweenness_from_sources(G, sources):
+    """Unnormalized betweenness contributions of the shortest paths starting at sources."""
+    return nx.betweenness_centrality_subset(G, sources=sources, targets=list(G), normalized=False, weight='weight')
+
+def _distances_from_sources(G, sources):
+    """Sum and count of shortest path distances from sources to every node (by node position)."""
+    position = {node: i for i, node in enumerate(G)}
+    distance_sums = np.zeros(len(position))
+    source_counts = np.zeros(len(position), dtype=np.int64)
+    for source in sources:
+        for node, distance in nx.single_source_dijkstra_path_length(G, source, weight='weight').items():
+            if node != source:
+                distance_sums[position[node]] += distance
+                source_counts[position[node]] += 1
+    return distance_sums, source_counts
+
+def _map_over_sources(func, G, sources, n_jobs):
+    """Run func(G, chunk) for chunks of sources, in a process pool when n_jobs > 1."""
+    if not n_jobs or n_jobs <= 1 or len(sources) < 2:
+        return [func(G, sources)]
+    chunks = [list(chunk) for chunk in np.array_split(np.array(sources, dtype=object), n_jobs) if len(chunk)]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(func, [G] * len(chunks), chunks))
+
+def sampled_betweenness_centrality(G, sources, n_jobs=None):
+    """Betweenness centrality estimated from shortest paths starting at the given sources.
+
+    With every node as a source this is exactly nx.betweenness_centrality(G, weight='weight').
+    """
+    n = G.number_of_nodes()
+    totals = dict.fromkeys(G, 0.0)
+    for partial in _map_over_sources(_betweenness_from_sources, G, sources, n_jobs):
+        for node, value in partial.items():
+            totals[node] += value
+
+    # Scale sampled sources up to all sources, then normalize like networkx (undirected)
+    scale = n / len(sources) if sources else 0.0
+    if n > 2:
+        scale *= 2 / ((n - 1) * (n - 2))
+    return {node: value * scale for node, value in totals.items()}
+
+def sampled_closeness_centrality(G, sources, n_jobs=None):
+    """Closeness centrality estimated from shortest path distances to the given sources.
+
+    Uses the networkx (Wasserman-Faust) formula, with each node's total distance to its
+    component extrapolated from the sources in that component. Nodes whose component has
+    no other source get an exact single-source computation.
+    """
+    n = G.number_of_nodes()
+    distance_sums = np.zeros(n)
+    source_counts = np.zeros(n, dtype=np.int64)
+    for partial_sums, partial_counts in _map_over_sources(_distances_from_sources, G, sources, n_jobs):
+        distance_sums += partial_sums
+        source_counts += partial_counts
+
+    closeness = {}
+    component_size = {node: len(component) for component in nx.connected_components(G) for node in component}
+    for i, node in enumerate(G):
+        reachable = component_size[node]
+        if reachable <= 1:
+            closeness[node] = 0.0
+            continue
+        if source_counts[i] > 0:
+            total_distance = distance_sums[i] * (reachable - 1) / source_counts[i]
+        else:
+            total_distance = sum(nx.single_source_dijkstra_path_length(G, node, weight='weight').values())
+        closeness[node] = (reachable - 1) / total_distance * (reachable - 1) / (n - 1) if total_distance > 0 else 0.0
+    return closeness
+
+def top_k_overlap(exact, approximate, k=10):
+    """Fraction of the exact top-k nodes that are also in the approximate top-k."""
+    k = min(k, len(exact))
+    if k == 0:
+        return 1.0
+    top_exact = {node for node, _ in sorted(exact.items(), key=lambda x: x[1], reverse=True)[:k]}
+    top_approximate = {node for node, _ in sorted(approximate.items(), key=lambda x: x[1], reverse=True)[:k]}
+    return len(top_exact & top_approximate) / k
+
+def graph_to_arrays(G):
+    """Node list plus COO edge arrays (positions into the node list) and edge weights."""
+    if isinstance(G, CompactResearchGraph):
+        return (G.nodes(), G.edge_store['src'].astype(np.int64), G.edge_store['dst'].astype(np.int64),
+                G.edge_weights.astype(float))
+    nodes = list(G)
+    position = {node: i for i, node in enumerate(nodes)}
+    num_edges = G.number_of_edges()
+    src = np.fromiter((position[u] for u, _ in G.edges()), dtype=np.int64, count=num_edges)
+    dst = np.fromiter((position[v] for _, v in G.edges()), dtype=np.int64, count=num_edges)
+    weight = np.fromiter((d.get('weight', 1) for _, _, d in G.edges(data=True)), dtype=float, count=num_edges)
+    return nodes, src, dst, weight
+
+def weighted_adjacency(num_nodes, src, dst, weight):
+    """Symmetric CSR adjacency matrix from COO edge arrays."""
+    rows = np.concatenate([src, dst])
+    cols = np.concatenate([dst, src])
+    return sparse.csr_matrix((np.concatenate([weight, weight]), (rows, cols)), shape=(num_nodes, num_nodes))
+
+def average_clustering_csr(adjacency):
+    """Average weighted clustering from a CSR adjacency (same definition as nx.average_clustering)."""
+    num_nodes = adjacency.shape[0]
+    if num_nodes == 0 or adjacency.nnz == 0:
+        return 0.0
+    # Geometric mean of the edge weights (normalized by the largest) around each triangle
+    scaled = (adjacency / adjacency.max()).power(1 / 3)
+    triangles = np.asarray((scaled @ scaled).multiply(scaled).sum(axis=1)).ravel()
+    degree = np.diff(adjacency.indptr)
+    clustering = np.zeros(num_nodes)
+    has_pairs = degree > 1
+    clustering[has_pairs] = triangles[has_pairs] / (degree[has_pairs] * (degree[has_pairs] - 1))
+    return float(clustering.mean())
+
+def partition_modularity(membership, src, dst, weight, resolution=1.0):
+    """Weighted modularity sum_c [L_c / m - resolution * (d_c / 2m)^2] of a partition, from COO arrays."""
+    membership = np.asarray(membership)
+    total = weight.sum()
+    if total == 0:
+        return 0.0
+    num_communities = membership.max() + 1
+    internal = np.bincount(membership[src][membership[src] == membership[dst]],
+                           weight[membership[src] == membership[dst]], minlength=num_communities)
+    strength = np.bincount(src, weight, minlength=len(membership)) + np.bincount(dst, weight, minlength=len(membership))
+    community_strength = np.bincount(membership, strength, minlength=num_communities)
+    return float((internal / total).sum() - resolution * ((community_strength / (2 * total)) ** 2).sum())
+
+@contextmanager
+def seeded_igraph_rng(seed):
+    """Seed igraph's process-wide random generator for one call, then restore its default.
+
+    igraph has no getter for the current generator; its default is the random module
+    (installed at import), which is put back even if the call raises.
+    """
+    igraph.set_random_number_generator(random.Random(seed))
+    try:
+        yield
+    finally:
+        igraph.set_random_number_generator(random)
+
+def _community_membership(args):
+    """Community membership for one resolution (module level so process pools can pickle it)."""
+    num_nodes, src, dst, weight, resolution, seed = args
+    if igraph is not None:
+        # Leiden: Louvain moves plus a refinement step that keeps communities well connected
+        graph = igraph.Graph(n=num_nodes, edges=np.column_stack([src, dst]).tolist(), directed=False)
+        with seeded_igraph_rng(seed):
+            partition = graph.community_leiden(objective_function='modularity', weights=weight.tolist(),
+                                               resolution=resolution, n_iterations=-1)
+        membership = np.array(partition.membership)
+    else:
+        # Without igraph fall back to seeded Louvain
+        G = nx.Graph()
+        G.add_nodes_from(range(num_nodes))
+        G.add_weighted_edges_from(zip(src.tolist(), dst.tolist(), weight.tolist()))
+        partition = community_louvain.best_partition(G, weight='weight', resolution=resolution, random_state=seed)
+        membership = np.array([partition[i] for i in range(num_nodes)])
+    # Number communities by first appearance so runs compare directly
+    _, first, inverse = np.unique(membership, return_index=True, return_inverse=True)
+    return np.argsort(np.argsort(first))[inverse]
+
+def detect_communities(num_nodes, src, dst, weight, resolutions=(0.5, 1.0, 2.0), seed=42, n_jobs=None):
+    """Community detection on COO/CSR edge arrays over several resolutions.
+
+    Each resolution runs Leiden (igraph, if installed; seeded Louvain otherwise) with the
+    same seed, in a process pool when n_jobs > 1. Returns a dict with one level per
+    resolution, from coarse (low resolution) to fine: its membership array, number of
+    communities, modularity and resolution-adjusted quality. 'parents' maps each level's
+    communities to the community of the next coarser level holding most of their nodes,
+    and 'best' is the index of the level with the highest modularity.
+    """
+    resolutions = sorted(resolutions)
+    src, dst, weight = np.asarray(src), np.asarray(dst), np.asarray(weight, dtype=float)
+    jobs = [(num_nodes, src, dst, weight, resolution, seed) for resolution in resolutions]
+    if n_jobs and n_jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            memberships = list(executor.map(_community_membership, jobs))
+    else:
+        memberships = [_community_membership(job) for job in jobs]
+
+    levels = []
+    for resolution, membership in zip(resolutions, memberships):
+        levels.append({
+            'resolution': resolution,
+            'membership': membership,
+            'num_communities': int(membership.max()) + 1 if num_nodes else 0,
+            'modularity': partition_modularity(membership, src, dst, weight) if num_nodes else 0.0,
+            'quality': partition_modularity(membership, src, dst, weight, resolution) if num_nodes else 0.0,
+        })
+
+    parents = []
+    for coarse, fine in zip(levels, levels[1:]):
+        # Overlap counts between fine and coarse communities; the largest overlap is the parent
+        overlap = sparse.coo_matrix((np.ones(num_nodes), (fine['membership'], coarse['membership'])),
+                                    shape=(fine['num_communities'], coarse['num_communities'])).toarray()
+        parents.append(overlap.argmax(axis=1))
+
+    best = int(np.argmax([level['modularity'] for level in levels])) if levels else None
+    return {'levels': levels, 'parents': parents, 'best': best}
+
+def set_partition(G, partition):
+    """Set the 'community' node attribute on an nx.Graph or CompactResearchGraph."""
+    if isinstance(G, CompactResearchGraph):
+        G.set_node_attributes(partition, 'community')
+    else:
+        nx.set_node_attributes(G, partition, 'community')
 
-        total_similarity = sum(shared_attributes.values())
+def calculate_network_metrics_igraph(G, seed=42, resolutions=None, n_jobs=None):
+    """Calculate the calculate_network_metrics metric set with igraph on CSR/COO arrays.
+
+    Returns the same metrics dict shape as the networkx backend and sets the
+    'community' node attribute on G.
+    """
+    if igraph is None:
+        raise ImportError("backend='igraph' needs the python-igraph package (pip install igraph)")
+
+    nodes, src, dst, weight = graph_to_arrays(G)
+    n = len(nodes)
+    graph = igraph.Graph(n=n, edges=np.column_stack([src, dst]).tolist(), directed=False)
+    graph.es['weight'] = weight.tolist()
+    adjacency = weighted_adjacency(n, src, dst, weight)
+
+    metrics = {'num_nodes': n, 'num_edges': len(src)}
+
+    # Centrality measures (rescaled to the networkx definitions)
+    degree = np.diff(adjacency.indptr)
+    metrics['degree_centrality'] = dict(zip(nodes, (degree / (n - 1)).tolist() if n > 1 else [1.0] * n))
+    components = graph.connected_components()
+    metrics['num_connected_components'] = len(components)
+    if len(src) == 0:
+        metrics['betweenness_centrality'] = {}
+        metrics['closeness_centrality'] = {}
+    else:
+        betweenness = np.array(graph.betweenness(weights='weight', directed=False))
+        if n > 2:
+            betweenness *= 2 / ((n - 1) * (n - 2))
+        metrics['betweenness_centrality'] = dict(zip(nodes, betweenness.tolist()))
+
+        # igraph closeness only looks at reachable nodes; apply the Wasserman-Faust factor
+        closeness = np.nan_to_num(np.array(graph.closeness(weights='weight', normalized=True), dtype=float))
+        reachable = np.array(components.sizes())[components.membership]
+        closeness *= (reachable - 1) / (n - 1)
+        metrics['closeness_centrality'] = dict(zip(nodes, closeness.tolist()))
+
+    metrics['average_clustering'] = average_clustering_csr(adjacency)
+
+    # Community detection (multilevel = Louvain, or a resolution sweep), seeded for reproducible runs
+    if len(src) > 0 and resolutions:
+        sweep = detect_communities(n, src, dst, weight, resolutions, seed, n_jobs)
+        partition = dict(zip(nodes, sweep['levels'][sweep['best']]['membership'].tolist()))
+        set_partition(G, partition)
+        metrics['communities'] = Counter(partition.values())
+        metrics['community_sweep'] = sweep
+    elif len(src) > 0:
+        with seeded_igraph_rng(seed):
+            membership = graph.community_multilevel(weights='weight').membership
+        partition = dict(zip(nodes, membership))
+        set_partition(G, partition)
+        metrics['communities'] = Counter(partition.values())
+    else:
+        metrics['communities'] = {}
 
-        if total_similarity > 0:
-            G.add_edge(output1, output2, weight=total_similarity, **shared_attributes)
+    return metrics, G
 
-    return G
+def calculate_network_metrics(G, approximate=False, epsilon=0.1, delta=0.1, num_sources=None,
+                              n_jobs=None, seed=42, validate=False, top_k=10, backend='networkx',
+                              resolutions=None):
+    """Calculate various network metrics.
+
+    approximate=True estimates betweenness and closeness from a random sample of source
+    nodes (num_sources, or enough for error epsilon with probability 1 - delta). When that
+    is every node, sampling saves nothing and the exact values are computed. n_jobs > 1
+    runs the per-source shortest paths in a process pool (exact or sampled). validate=True
+    also computes the exact values and reports the top-k ranking overlap in
+    metrics['approximation'].
+
+    backend='igraph' runs the exact metric set on igraph's compiled graph instead
+    (see calculate_network_metrics_igraph); the approximation options do not apply.
+    G can also be a CompactResearchGraph (materialized for the networkx backend).
+
+    resolutions runs detect_communities over those resolutions (in parallel with n_jobs)
+    instead of a single Louvain run; the partition with the best modularity is used and
+    the full sweep is returned in metrics['community_sweep'].
+    """
+    if backend == 'igraph':
+        return calculate_network_metrics_igraph(G, seed, resolutions, n_jobs)
+    if backend != 'networkx':
+        raise ValueError(f"Unknown metrics backend '{backend}', expected 'networkx' or 'igraph'")
+    if isinstance(G, CompactResearchGraph):
+        # networkx algorithms need a real graph
+        G = G.to_networkx()
 
-def calculate_network_metrics(G):
-    """Calculate various network metrics."""
     metrics = {}
 
     metrics['num_nodes'] = G.number_of_nodes()
     metrics['num_edges'] = G.number_of_edges()
+    component_sizes = cached_component_sizes(G)
+    if component_sizes is not None:
+        metrics['num_connected_components'] = len(component_sizes)
+    else:
+        metrics['num_connected_components'] = nx.number_connected_components(G) if G.number_of_nodes() > 0 else 0
 
     # Centrality measures
     metrics['degree_centrality'] = nx.degree_centrality(G)
-    metrics['betweenness_centrality'] = nx.betweenness_centrality(G, weight='weight') if G.number_of_edges() > 0 else {}
-    metrics['closeness_centrality'] = nx.closeness_centrality(G, distance='weight') if G.number_of_edges() > 0 else {}
+    if G.number_of_edges() == 0:
+        metrics['betweenness_centrality'] = {}
+        metrics['closeness_centrality'] = {}
+    else:
+        nodes = list(G)
+        k = len(nodes)
+        if approximate:
+            k = min(num_sources if num_sources else num_pivots(len(nodes), epsilon, delta), len(nodes))
+        if k < len(nodes):
+            sources = list(np.random.default_rng(seed).choice(np.array(nodes, dtype=object), size=k, replace=False))
+        elif n_jobs and n_jobs > 1:
+            sources = nodes
+        else:
+            sources = None
+
+        if sources is None:
+            metrics['betweenness_centrality'] = nx.betweenness_centrality(G, weight='weight')
+            metrics['closeness_centrality'] = nx.closeness_centrality(G, distance='weight')
+        else:
+            metrics['betweenness_centrality'] = sampled_betweenness_centrality(G, sources, n_jobs)
+            metrics['closeness_centrality'] = sampled_closeness_centrality(G, sources, n_jobs)
+        if approximate:
+            metrics['approximation'] = {'num_sources': k, 'exact': k == len(nodes),
+                                        'epsilon': None if num_sources else epsilon,
+                                        'delta': None if num_sources else delta}
+            if validate:
+                exact_betweenness = nx.betweenness_centrality(G, weight='weight')
+                exact_closeness = nx.closeness_centrality(G, distance='weight')
+                metrics['approximation']['top_k'] = top_k
+                metrics['approximation']['betweenness_top_k_overlap'] = top_k_overlap(
+                    exact_betweenness, metrics['betweenness_centrality'], top_k)
+                metrics['approximation']['closeness_top_k_overlap'] = top_k_overlap(
+                    exact_closeness, metrics['closeness_centrality'], top_k)
 
     # Clustering - handle case when no edges or all clustering coefficients are zero
     try:
@@ -141,8 +968,15 @@ def calculate_network_metrics(G):
         metrics['average_clustering'] = 0.0
 
     # Community detection
-    if G.number_of_edges() > 0:
-        partition = community_louvain.best_partition(G, weight='weight')
+    if G.number_of_edges() > 0 and resolutions:
+        nodes, src, dst, weight = graph_to_arrays(G)
+        sweep = detect_communities(len(nodes), src, dst, weight, resolutions, seed, n_jobs)
+        partition = dict(zip(nodes, sweep['levels'][sweep['best']]['membership'].tolist()))
+        nx.set_node_attributes(G, partition, 'community')
+        metrics['communities'] = Counter(partition.values())
+        metrics['community_sweep'] = sweep
+    elif G.number_of_edges() > 0:
+        partition = community_louvain.best_partition(G, weight='weight', random_state=seed)
         nx.set_node_attributes(G, partition, 'community')
         metrics['communities'] = Counter(partition.values())
     else:
@@ -150,88 +984,449 @@ def calculate_network_metrics(G):
 
     return metrics, G
 
-def visualize_graph(G, max_nodes=10):
-    """Visualize the graph with communities highlighted, showing node titles and edge attributes."""
-    if len(G.nodes()) > max_nodes:
-        print(f"Graph too large ({len(G.nodes())} nodes), visualizing a sample")
-        nodes = list(G.nodes())
-        nodes_sample = nodes[:max_nodes]
-        G = G.subgraph(nodes_sample)
-
-    # Get community information if available
-    communities = nx.get_node_attributes(G, 'community')
-    if communities:
-        node_color = [communities[n] for n in G.nodes()]
-    else:
-        node_color = 'blue'
+def grid_repulsion(xy, mass, scaling, max_depth=10):
+    """ForceAtlas2 repulsion (scaling * m_i * m_j / d) with a multilevel grid approximation.
+
+    Like Barnes-Hut, far-away nodes are summarized by the mass and center of mass of their
+    quadtree cell: at each level a node interacts with the cells that are children of its
+    parent's neighbors but not its own neighbors, and at the finest level it interacts
+    directly with the nodes of the 3x3 surrounding cells. Cost is O(n log n).
+    """
+    n = len(xy)
+    force = np.zeros_like(xy)
+    if n < 2:
+        return force
+    depth = int(np.clip(np.ceil(np.log(n) / np.log(4)), 2, max_depth))
+    low = xy.min(axis=0)
+    span = max((xy.max(axis=0) - low).max(), 1e-9) * (1 + 1e-9)
+    unit = (xy - low) / span
+
+    def add_interactions(i, other_xy, other_mass):
+        delta = xy[i] - other_xy
+        dist2 = np.maximum((delta ** 2).sum(axis=1), 1e-9)
+        magnitude = scaling * mass[i] * other_mass / dist2
+        force[:, 0] += np.bincount(i, magnitude * delta[:, 0], minlength=n)
+        force[:, 1] += np.bincount(i, magnitude * delta[:, 1], minlength=n)
+
+    # Far field: cell interaction lists from level 2 down to the finest level
+    offsets = np.arange(-2, 4)
+    for level in range(2, depth + 1):
+        size = 2 ** level
+        cell = np.minimum((unit * size).astype(np.int64), size - 1)
+        key = cell[:, 0] * size + cell[:, 1]
+        cell_mass = np.bincount(key, mass, minlength=size * size)
+        occupied = cell_mass > 0
+        cell_xy = np.zeros((size * size, 2))
+        cell_xy[occupied, 0] = np.bincount(key, mass * xy[:, 0], minlength=size * size)[occupied] / cell_mass[occupied]
+        cell_xy[occupied, 1] = np.bincount(key, mass * xy[:, 1], minlength=size * size)[occupied] / cell_mass[occupied]
+
+        base = (cell // 2) * 2
+        cx = base[:, 0][:, None, None] + offsets[None, :, None]
+        cy = base[:, 1][:, None, None] + offsets[None, None, :]
+        far = (np.abs(cx - cell[:, 0][:, None, None]) > 1) | (np.abs(cy - cell[:, 1][:, None, None]) > 1)
+        valid = far & (cx >= 0) & (cx < size) & (cy >= 0) & (cy < size)
+        i, a, b = np.nonzero(valid)
+        other = cx[i, a, 0] * size + cy[i, 0, b]
+        keep = occupied[other]
+        add_interactions(i[keep], cell_xy[other[keep]], cell_mass[other[keep]])
+
+    # Near field: direct interactions with nodes in the 3x3 surrounding finest cells
+    size = 2 ** depth
+    cell = np.minimum((unit * size).astype(np.int64), size - 1)
+    key = cell[:, 0] * size + cell[:, 1]
+    order = np.argsort(key, kind='stable')
+    starts = np.searchsorted(key[order], np.arange(size * size))
+    counts = np.bincount(key, minlength=size * size)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            nx_, ny_ = cell[:, 0] + dx, cell[:, 1] + dy
+            inside = np.flatnonzero((nx_ >= 0) & (nx_ < size) & (ny_ >= 0) & (ny_ < size))
+            neighbor = nx_[inside] * size + ny_[inside]
+            pair_counts = counts[neighbor]
+            i = np.repeat(inside, pair_counts)
+            rank = np.arange(pair_counts.sum()) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+            j = order[np.repeat(starts[neighbor], pair_counts) + rank]
+            keep = i != j
+            add_interactions(i[keep], xy[j[keep]], mass[j[keep]])
+    return force
+
+def force_atlas2_layout(num_nodes, src, dst, weight, xy=None, iterations=100, scaling=2.0, gravity=1.0,
+                        tolerance=1.0, seed=42):
+    """ForceAtlas2-style layout on COO edge arrays with NumPy.
+
+    Nodes repel in proportion to (degree + 1) (grid_repulsion), edges attract linearly
+    with their weight, a constant gravity pulls towards the center, and the step size
+    adapts per node from its swing like ForceAtlas2. xy gives starting positions
+    (warm start); otherwise they are random. Returns an (n, 2) position array.
+    """
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-1, 1, size=(num_nodes, 2)) * np.sqrt(max(num_nodes, 1)) if xy is None else np.array(xy, dtype=float)
+    if num_nodes == 0:
+        return xy.reshape(0, 2)
+    mass = np.bincount(src, minlength=num_nodes) + np.bincount(dst, minlength=num_nodes) + 1.0
+    previous = np.zeros_like(xy)
+    speed = 1.0
+    for _ in range(iterations):
+        force = grid_repulsion(xy, mass, scaling)
+
+        # Linear attraction along edges
+        pull = (xy[src] - xy[dst]) * weight[:, None]
+        for axis in range(2):
+            force[:, axis] -= np.bincount(src, pull[:, axis], minlength=num_nodes)
+            force[:, axis] += np.bincount(dst, pull[:, axis], minlength=num_nodes)
+
+        # Gravity towards the center
+        center = xy - xy.mean(axis=0)
+        distance = np.maximum(np.linalg.norm(center, axis=1), 1e-9)
+        force -= (gravity * mass / distance)[:, None] * center
+
+        # Adaptive speed from swing (oscillation) and traction (consistent movement)
+        swing = np.linalg.norm(force - previous, axis=1)
+        traction = np.linalg.norm(force + previous, axis=1) / 2
+        global_swing = max((mass * swing).sum(), 1e-9)
+        speed = min(tolerance * (mass * traction).sum() / global_swing, 1.5 * speed)
+        local_speed = speed / (1 + speed * np.sqrt(swing))
+        xy = xy + local_speed[:, None] * force
+        previous = force
+    return xy
+
+def layout_graph(G, pos=None, iterations=100, warm_iterations=30, seed=42):
+    """Node positions for G with force_atlas2_layout.
+
+    pos can hold cached positions (e.g. from load_layout). Nodes that all have cached
+    positions are returned as is; otherwise cached nodes start where they were, new nodes
+    start at the mean position of their placed neighbors, and warm_iterations refine it.
+    """
+    nodes, edges = graph_edge_table(G)
+    n = len(nodes)
+    pos = pos or {}
+    placed = np.array([node in pos for node in nodes], dtype=bool)
+    if n and placed.all():
+        return {node: np.asarray(pos[node], dtype=float) for node in nodes}
+    if not placed.any():
+        xy = force_atlas2_layout(n, edges['src'], edges['dst'], edges['weight'], iterations=iterations, seed=seed)
+        return dict(zip(nodes, xy))
+
+    rng = np.random.default_rng(seed)
+    xy = np.zeros((n, 2))
+    xy[placed] = [pos[node] for node in np.array(nodes, dtype=object)[placed]]
+    src, dst = edges['src'], edges['dst']
+    # Sum of placed neighbor positions for each new node
+    totals = np.zeros((n, 2))
+    counts = np.zeros(n)
+    for a, b in ((src, dst), (dst, src)):
+        from_placed = placed[b] & ~placed[a]
+        np.add.at(totals, a[from_placed], xy[b[from_placed]])
+        np.add.at(counts, a[from_placed], 1)
+    spread = xy[placed].std(axis=0).mean() if placed.sum() > 1 else 1.0
+    new = ~placed
+    xy[new] = rng.normal(xy[placed].mean(axis=0), spread, size=(new.sum(), 2))
+    linked = new & (counts > 0)
+    xy[linked] = totals[linked] / counts[linked][:, None] + rng.normal(0, 0.05 * spread, size=(linked.sum(), 2))
+    xy = force_atlas2_layout(n, src, dst, edges['weight'], xy=xy, iterations=warm_iterations, seed=seed)
+    return dict(zip(nodes, xy))
+
+def save_layout(path, pos):
+    """Save node positions next to a graph artifact (layout.parquet)."""
+    os.makedirs(path, exist_ok=True)
+    xy = np.array(list(pos.values()), dtype=float).reshape(len(pos), 2)
+    pd.DataFrame({'output_id': list(pos), 'x': xy[:, 0], 'y': xy[:, 1]}).to_parquet(
+        os.path.join(path, "layout.parquet"), index=False)
+
+def load_layout(path):
+    """Load saved node positions, or None if the artifact has no layout."""
+    layout_path = os.path.join(path, "layout.parquet")
+    if not os.path.exists(layout_path):
+        return None
+    layout = pd.read_parquet(layout_path)
+    return dict(zip(layout['output_id'], layout[['x', 'y']].to_numpy()))
+
+# Graphs up to LABEL_NODES nodes get title and shared-attribute labels; above
+# RASTER_EDGES edges the edges are drawn as a density image instead of lines
+LABEL_NODES = 30
+RASTER_EDGES = 20000
+
+def edge_label(d):
+    """Label listing the shared attributes of one edge."""
+    edge_label_parts = []
+    if d.get('shared_authors', 0) > 0:
+        edge_label_parts.append(f"Authors: {d['shared_authors']}")
+    if d.get('shared_datasets', 0) > 0:
+        edge_label_parts.append(f"Datasets: {d['shared_datasets']}")
+    if d.get('shared_topics', 0) > 0:
+        edge_label_parts.append(f"Topics: {d['shared_topics']}")
+    if d.get('shared_affiliations', 0) > 0:
+        edge_label_parts.append(f"Affiliations: {d['shared_affiliations']}")
+    if d.get('same_location', 0) > 0:
+        edge_label_parts.append("Same Location")
+    return "\n".join(edge_label_parts)
+
+def edge_density_image(xy, src, dst, weight, bins=1024, samples_per_edge=16):
+    """Rasterize edges into a weighted 2D histogram by sampling points along each segment."""
+    extent = [xy[:, 0].min(), xy[:, 0].max(), xy[:, 1].min(), xy[:, 1].max()]
+    density = np.zeros((bins, bins))
+    t = np.linspace(0, 1, samples_per_edge)
+    chunk = max(1, 2_000_000 // samples_per_edge)
+    for start in range(0, len(src), chunk):
+        s, d, w = src[start:start + chunk], dst[start:start + chunk], weight[start:start + chunk]
+        points = xy[s][:, None, :] + t[None, :, None] * (xy[d] - xy[s])[:, None, :]
+        hist, _, _ = np.histogram2d(points[..., 0].ravel(), points[..., 1].ravel(), bins=bins,
+                                    range=[extent[:2], extent[2:]], weights=np.repeat(w, samples_per_edge))
+        density += hist
+    return np.log1p(density.T), extent
+
+def visualize_graph(G, max_nodes=None, output_path=None, pos=None, dpi=150, raster_edges=RASTER_EDGES):
+    """Visualize the graph with communities highlighted, showing node titles and edge attributes.
+
+    All edges go into one LineCollection with a per-edge alpha (or a log-density image
+    above raster_edges edges); titles and edge labels are only drawn for small graphs.
+    max_nodes limits the drawing to the first max_nodes nodes. With output_path the figure
+    is rendered headless to that file (format from the extension, e.g. .png or .svg)
+    instead of shown. pos can pass precomputed node positions (default: layout_graph).
+    """
+    if max_nodes is not None and G.number_of_nodes() > max_nodes:
+        print(f"Graph too large ({G.number_of_nodes()} nodes), visualizing a sample")
+        G = G.subgraph(G.nodes()[:max_nodes] if isinstance(G, CompactResearchGraph) else list(G.nodes())[:max_nodes])
+
+    nodes, edges = graph_edge_table(G)
+    weight = edges['weight'].astype(float)
+
+    if pos is None:
+        pos = layout_graph(G)
+    xy = np.array([pos[n] for n in nodes], dtype=float).reshape(len(nodes), 2)
+
+    # Headless figure when writing to a file, pyplot figure when showing
+    fig = Figure(figsize=(20, 20)) if output_path else plt.figure(figsize=(20, 20))
+    ax = fig.add_subplot()
 
-    plt.figure(figsize=(20, 20))
-    pos = nx.spring_layout(G, weight='weight', k=0.5, iterations=100)
+    # Draw edges with transparency based on weight
+    if len(edges['src']) > raster_edges:
+        image, extent = edge_density_image(xy, edges['src'], edges['dst'], weight)
+        ax.imshow(image, extent=extent, origin='lower', cmap='Greys', interpolation='bilinear', aspect='auto')
+    elif len(edges['src']):
+        colors = np.zeros((len(weight), 4))
+        colors[:, :3] = 0.5  # gray
+        colors[:, 3] = 0.1 + 0.9 * (weight / weight.max())
+        ax.add_collection(LineCollection(np.stack([xy[edges['src']], xy[edges['dst']]], axis=1),
+                                         colors=colors, linewidths=2 if len(nodes) <= LABEL_NODES else 0.5))
 
     # Draw nodes colored by community
-    nx.draw_networkx_nodes(G, pos, node_color=node_color, cmap=plt.cm.tab20, node_size=800, alpha=0.8)
-
-    # Draw edges with transparency based on weight
-    edges = G.edges(data=True)
-    edge_weights = [d.get('weight', 1) for _, _, d in edges]
-    max_weight = max(edge_weights) if edge_weights else 1
-    edge_alphas = [0.1 + 0.9*(w/max_weight) for w in edge_weights]
-
-    # Draw edges with labels showing shared attributes
-    for i, (u, v, d) in enumerate(G.edges(data=True)):
-        # Create edge label showing all shared attributes
-        edge_label_parts = []
-        if d.get('shared_authors', 0) > 0:
-            edge_label_parts.append(f"Authors: {d['shared_authors']}")
-        if d.get('shared_datasets', 0) > 0:
-            edge_label_parts.append(f"Datasets: {d['shared_datasets']}")
-        if d.get('shared_topics', 0) > 0:
-            edge_label_parts.append(f"Topics: {d['shared_topics']}")
-        if d.get('shared_affiliations', 0) > 0:
-            edge_label_parts.append(f"Affiliations: {d['shared_affiliations']}")
-        if d.get('same_location', 0) > 0:
-            edge_label_parts.append("Same Location")
-
-        edge_label = "\n".join(edge_label_parts)
-
-        # Draw the edge with label
-        nx.draw_networkx_edges(G, pos, edgelist=[(u, v)], alpha=edge_alphas[i], width=2, edge_color='gray')
-
-        # Add edge label at midpoint
-        if edge_label:  # Only add label if there are shared attributes
-            x = (pos[u][0] + pos[v][0]) / 2
-            y = (pos[u][1] + pos[v][1]) / 2
-            plt.text(x, y, edge_label,
-                    bbox=dict(facecolor='white', alpha=0.7, edgecolor='none'),
-                    fontsize=8, ha='center', va='center')
-
-    # Draw node labels with titles
-    node_labels = {n: f"{G.nodes[n].get('title', n)[:30]}\n(Year: {G.nodes[n].get('year', 'N/A')})"
-                  for n in G.nodes()}
-    nx.draw_networkx_labels(G, pos, labels=node_labels, font_size=10, font_weight='bold')
-
-    plt.title("Research Outputs Network\nNodes colored by community, edges show shared attributes", fontsize=14)
-    plt.axis('off')
+    communities = {n: c for n, c in G.nodes(data='community') if c is not None}
+    node_size = 800 if len(nodes) <= LABEL_NODES else max(4, 8000 / max(len(nodes), 1))
+    if communities:
+        # Same tab20(c % 20) colors as the legend, so ids >= 20 wrap instead of clamping
+        node_color = plt.cm.tab20(np.array([communities.get(n, 0) for n in nodes], dtype=int) % 20)
+        ax.scatter(xy[:, 0], xy[:, 1], c=node_color, s=node_size, alpha=0.8, zorder=2)
+    else:
+        ax.scatter(xy[:, 0], xy[:, 1], c='blue', s=node_size, alpha=0.8, zorder=2)
+
+    if 0 < len(nodes) <= LABEL_NODES:
+        # Add edge labels at midpoints
+        for u, v, d in G.edges(data=True):
+            label = edge_label(d)
+            if label:  # Only add label if there are shared attributes
+                x = (pos[u][0] + pos[v][0]) / 2
+                y = (pos[u][1] + pos[v][1]) / 2
+                ax.text(x, y, label, bbox=dict(facecolor='white', alpha=0.7, edgecolor='none'),
+                        fontsize=8, ha='center', va='center')
+
+        # Draw node labels with titles
+        for n, d in G.nodes(data=True):
+            ax.text(pos[n][0], pos[n][1], f"{str(d.get('title', n))[:30]}\n(Year: {d.get('year', 'N/A')})",
+                    fontsize=10, fontweight='bold', ha='center', va='center', zorder=3)
+
+    ax.set_title("Research Outputs Network\nNodes colored by community, edges show shared attributes", fontsize=14)
+    ax.autoscale()
+    ax.axis('off')
 
     # Add legend for community colors if communities exist
     if communities:
-        unique_communities = set(communities.values())
+        unique_communities = sorted(set(communities.values()))[:20]
         handles = [plt.Line2D([0], [0], marker='o', color='w',
-                             markerfacecolor=plt.cm.tab20(i), markersize=10)
-                  for i in range(len(unique_communities))]
-        plt.legend(handles, [f"Community {i}" for i in unique_communities],
+                             markerfacecolor=plt.cm.tab20(c % 20), markersize=10)
+                  for c in unique_communities]
+        ax.legend(handles, [f"Community {c}" for c in unique_communities],
                   loc='upper right', bbox_to_anchor=(1.1, 1.1))
 
-    plt.tight_layout()
-    plt.show()
+    fig.tight_layout()
+    if output_path:
+        fig.savefig(output_path, dpi=dpi)
+    else:
+        plt.show()
+
+# Saved graph artifacts (next to this module): bump the format version when the layout below changes
+script_dir = os.path.dirname(os.path.realpath(__file__))
+GRAPH_ARTIFACT_DIR = os.path.join(script_dir, "graph_artifacts")
+GRAPH_ARTIFACT_VERSION = 1
+NODE_METRICS = ['degree_centrality', 'betweenness_centrality', 'closeness_centrality']
+SCALAR_METRICS = ['num_nodes', 'num_edges', 'num_connected_components', 'average_clustering']
+
+def get_input_version(full_path):
+    """Content hash of a hand-off file (and of the up-to-date Parquet copy load_handoff reads)."""
+    digest = hashlib.sha256()
+    for path in [full_path, handoff_parquet_file(full_path)]:
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def get_artifact_path(filepath, input_version, artifact_dir=GRAPH_ARTIFACT_DIR):
+    """Artifact directory for one input file version."""
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    return os.path.join(artifact_dir, f"{stem}-v{GRAPH_ARTIFACT_VERSION}-{input_version}")
+
+def find_previous_artifact(filepath, artifact_path, artifact_dir=GRAPH_ARTIFACT_DIR):
+    """Most recently written other artifact of the same input file that has a layout, or None."""
+    if not os.path.isdir(artifact_dir):
+        return None
+    prefix = os.path.basename(get_artifact_path(filepath, '', artifact_dir))
+    candidates = [os.path.join(artifact_dir, name) for name in os.listdir(artifact_dir) if name.startswith(prefix)]
+    candidates = [path for path in candidates if os.path.normpath(path) != os.path.normpath(artifact_path)
+                  and os.path.exists(os.path.join(path, "layout.parquet"))]
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+def graph_edge_table(G):
+    """Node list plus edge arrays (src < dst positions, sorted) with the weight and every edge attribute."""
+    if isinstance(G, CompactResearchGraph):
+        edges = {name: G.edge_store[name].astype(np.int64) for name in EDGE_DTYPE.names}
+        edges['weight'] = G.edge_weights
+        return G.nodes(), edges
+    nodes = list(G)
+    position = {node: i for i, node in enumerate(nodes)}
+    rows = [(position[u], position[v], d.get('weight', 1), *(d.get(name, 0) for name in EDGE_ATTRIBUTES))
+            for u, v, d in G.edges(data=True)]
+    table = np.array(rows, dtype=float).reshape(len(rows), 3 + len(EDGE_ATTRIBUTES))
+    src, dst = table[:, :2].min(axis=1).astype(np.int64), table[:, :2].max(axis=1).astype(np.int64)
+    order = np.lexsort((dst, src))
+    edges = {'src': src[order], 'dst': dst[order], 'weight': table[order, 2]}
+    for k, name in enumerate(EDGE_ATTRIBUTES):
+        edges[name] = table[order, 3 + k].astype(np.int64)
+    return nodes, edges
+
+def save_graph_artifact(G, metrics, path, input_version):
+    """Save the graph (CSR edges + node table), its metrics and the community partition.
+
+    Layout: edges.npz holds the upper-triangle CSR (indptr, indices) and one array per edge
+    attribute; nodes.parquet holds node attributes, the community and per-node centralities;
+    metrics.json holds the scalar metrics and the artifact/input versions; communities.npz
+    holds the resolution sweep, if one was run.
+    """
+    os.makedirs(path, exist_ok=True)
+    nodes, edges = graph_edge_table(G)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(edges['src'], minlength=len(nodes)))])
+    np.savez_compressed(os.path.join(path, "edges.npz"), indptr=indptr, indices=edges['dst'],
+                        **{name: edges[name] for name in EDGE_ATTRIBUTES})
+
+    node_data = G.nodes(data=True)
+    node_table = pd.DataFrame({
+        'output_id': nodes,
+        'title': [d.get('title') for _, d in node_data],
+        'year': pd.Series([d.get('year') for _, d in node_data], dtype=float),
+        'location': [d.get('location') for _, d in node_data],
+        'community': pd.Series([d.get('community') for _, d in node_data], dtype='Int64'),
+    })
+    for name in LIST_ATTRIBUTES:
+        node_table[name] = [list(d.get(name, [])) for _, d in node_data]
+    for name in NODE_METRICS:
+        node_table[name] = pd.Series([metrics[name].get(node) for node in nodes], dtype=float)
+    node_table.to_parquet(os.path.join(path, "nodes.parquet"), index=False)
+
+    summary = {name: metrics[name] for name in SCALAR_METRICS}
+    summary.update({'artifact_version': GRAPH_ARTIFACT_VERSION, 'input_version': input_version,
+                    'has_centrality': bool(metrics['betweenness_centrality'])})
+    if 'approximation' in metrics:
+        summary['approximation'] = metrics['approximation']
+    with open(os.path.join(path, "metrics.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    # Resolution sweep: one membership row per level, so any granularity can be picked later
+    if 'community_sweep' in metrics:
+        sweep = metrics['community_sweep']
+        levels = sweep['levels']
+        np.savez_compressed(os.path.join(path, "communities.npz"),
+                            membership=np.array([level['membership'] for level in levels]),
+                            **{name: np.array([level[name] for level in levels])
+                               for name in ['resolution', 'num_communities', 'modularity', 'quality']},
+                            best=sweep['best'], **{f"parents_{k}": parents for k, parents in enumerate(sweep['parents'])})
+
+def load_graph_artifact(path, input_version):
+    """Load a saved graph artifact as (CompactResearchGraph, metrics).
+
+    Returns None if the artifact is missing or was written for another format or input version.
+    """
+    metrics_path = os.path.join(path, "metrics.json")
+    if not os.path.exists(metrics_path):
+        return None
+    with open(metrics_path) as f:
+        summary = json.load(f)
+    if summary.get('artifact_version') != GRAPH_ARTIFACT_VERSION or summary.get('input_version') != input_version:
+        return None
+
+    node_table = pd.read_parquet(os.path.join(path, "nodes.parquet"))
+    output_attributes = {}
+    for row in node_table.itertuples(index=False):
+        output_attributes[row.output_id] = {
+            'type': 'output', 'title': row.title, 'year': None if pd.isna(row.year) else row.year,
+            'location': None if pd.isna(row.location) else row.location, **{name: list(getattr(row, name)) for name in LIST_ATTRIBUTES}}
+
+    with np.load(os.path.join(path, "edges.npz")) as stored:
+        edges = {'src': np.repeat(np.arange(len(node_table)), np.diff(stored['indptr'])), 'dst': stored['indices']}
+        edges.update({name: stored[name] for name in EDGE_ATTRIBUTES})
+    G = CompactResearchGraph(output_attributes, edges)
+
+    nodes = node_table['output_id'].tolist()
+    metrics = {name: summary[name] for name in SCALAR_METRICS}
+    for name in NODE_METRICS:
+        metrics[name] = dict(zip(nodes, node_table[name].tolist()))
+    if not summary['has_centrality']:
+        metrics['betweenness_centrality'] = {}
+        metrics['closeness_centrality'] = {}
+    if 'approximation' in summary:
+        metrics['approximation'] = summary['approximation']
+
+    communities_path = os.path.join(path, "communities.npz")
+    if os.path.exists(communities_path):
+        with np.load(communities_path) as stored:
+            levels = [{'resolution': float(resolution), 'membership': membership, 'num_communities': int(count),
+                       'modularity': float(modularity), 'quality': float(quality)}
+                      for membership, resolution, count, modularity, quality in zip(
+                          stored['membership'], stored['resolution'], stored['num_communities'],
+                          stored['modularity'], stored['quality'])]
+            parents = [stored[f"parents_{k}"] for k in range(len(levels) - 1)]
+            metrics['community_sweep'] = {'levels': levels, 'parents': parents, 'best': int(stored['best'])}
+
+    communities = node_table['community']
+    if communities.notna().any():
+        partition = dict(zip(nodes, communities.astype(int).tolist()))
+        G.set_node_attributes(partition, 'community')
+        metrics['communities'] = Counter(partition.values())
+    else:
+        metrics['communities'] = {}
+    return G, metrics
 
-def analyze_network(filepath):
-    """Complete analysis pipeline."""
-    df = load_and_preprocess_data(filepath)
-    G = construct_research_graph(df)
-    metrics, G = calculate_network_metrics(G)
+def analyze_network(filepath, use_artifact=True, artifact_dir=GRAPH_ARTIFACT_DIR):
+    """Complete analysis pipeline.
+
+    With use_artifact=True the graph, metrics and partition are reloaded from the saved
+    artifact when the input file has not changed, and saved after a fresh computation.
+    The plot layout is cached in the artifact too. The graph is returned as an nx.Graph
+    on both paths; a reloaded CompactResearchGraph is materialized with to_networkx().
+    """
+    input_version = get_input_version(handoff_path(filepath))
+    artifact_path = get_artifact_path(filepath, input_version, artifact_dir)
+    artifact = load_graph_artifact(artifact_path, input_version) if use_artifact else None
+    if artifact is not None:
+        print(f"Loaded graph and metrics from {artifact_path}")
+        G, metrics = artifact
+        G = G.to_networkx()
+    else:
+        df = load_and_preprocess_data(filepath)
+        G = construct_research_graph(df)
+        metrics, G = calculate_network_metrics(G)
+        if use_artifact:
+            save_graph_artifact(G, metrics, artifact_path, input_version)
 
-    num_connected_components = nx.number_connected_components(G)
+    num_connected_components = metrics['num_connected_components']
     print(f"The graph has {num_connected_components} connected components")
 
     print(f"Network with {metrics['num_nodes']} outputs and {metrics['num_edges']} connections")
@@ -241,22 +1436,32 @@ def analyze_network(filepath):
         print(f"Detected {len(metrics['communities'])} communities")
 
     # Get top outputs by different centrality measures
+    titles = dict(G.nodes(data='title'))
     print("\nTop outputs by degree centrality (most connections):")
     for output, score in sorted(metrics['degree_centrality'].items(), key=lambda x: x[1], reverse=True)[:5]:
-        print(f"{score:.3f}: {G.nodes[output].get('title', output)}")
+        print(f"{score:.3f}: {titles.get(output) or output}")
 
     print("\nTop outputs by betweenness centrality (bridge outputs):")
     for output, score in sorted(metrics['betweenness_centrality'].items(), key=lambda x: x[1], reverse=True)[:5]:
-        print(f"{score:.3f}: {G.nodes[output].get('title', output)}")
-
-    visualize_graph(G)
+        print(f"{score:.3f}: {titles.get(output) or output}")
+
+    # Layout: reuse this artifact's positions, or warm-start from the previous input version
+    pos = None
+    if use_artifact:
+        cached = load_layout(artifact_path)
+        own_layout = cached is not None
+        if cached is None:
+            previous_path = find_previous_artifact(filepath, artifact_path, artifact_dir)
+            cached = load_layout(previous_path) if previous_path else None
+        pos = layout_graph(G, pos=cached)
+        # Save unless these are this artifact's own, complete positions (a warm start is saved too)
+        if not own_layout or len(cached) != len(pos):
+            save_layout(artifact_path, pos)
+
+    visualize_graph(G, pos=pos)
 
     return G, metrics
 
-research_graph, metrics = analyze_network('unique_research_outputs.csv')
-
-research_graph, metrics = analyze_network('unique_outputs_webscraping.csv')
-
 # Test data
 TEST_CSV_DATA = """title,authors,year,matched_dataset_terms,doi,topics,affiliations,location
 "Paper 1","{'Author A', 'Author B'}",2020,"dataset1; dataset2","doi1","topic1; topic2","affil1; affil2","loc1"
@@ -328,8 +1533,116 @@ def test_construct_research_graph():
     assert edge_data['shared_topics'] == 1
     assert edge_data['shared_affiliations'] == 1
     assert edge_data['same_location'] == 1
+
+    # Cached component arrays are only trusted while the graph still matches them
+    assert cached_component_sizes(G).tolist() == [2, 1]
+    assert cached_component_sizes(G.copy()).tolist() == [2, 1]
+    assert cached_component_sizes(G.subgraph(['1', '2'])) is None
+    assert calculate_network_metrics(G.subgraph(['1', '2']))[0]['num_connected_components'] == 1
+    G.remove_edge('1', '2')
+    assert cached_component_sizes(G) is None
+    assert calculate_network_metrics(G)[0]['num_connected_components'] == 3
     print("construct_research_graph tests passed!")
 
+def test_compute_edge_arrays():
+    print("\nTesting compute_edge_arrays...")
+    output_attributes = {
+        '1': {'authors': ['Author A', 'Author B'], 'datasets': ['dataset1'], 'topics': ['topic1'],
+              'affiliations': [], 'location': 'loc1'},
+        '2': {'authors': ['Author B', 'Author B'], 'datasets': [], 'topics': ['topic2'],
+              'affiliations': [], 'location': None},
+        '3': {'authors': ['Author C'], 'datasets': ['dataset1'], 'topics': ['topic1', 'topic2'],
+              'affiliations': [], 'location': 'loc1'},
+    }
+    edges = compute_edge_arrays(output_attributes)
+
+    # Only pairs sharing something get an edge, ordered like itertools.combinations
+    assert edges['src'].tolist() == [0, 0, 1]
+    assert edges['dst'].tolist() == [1, 2, 2]
+    assert edges['shared_authors'].tolist() == [1, 0, 0]  # duplicate author counted once
+    assert edges['shared_datasets'].tolist() == [0, 1, 0]
+    assert edges['shared_topics'].tolist() == [0, 1, 1]
+    assert edges['same_location'].tolist() == [0, 1, 0]  # missing location never matches
+    assert edges['weight'].tolist() == [1, 3, 1]
+
+    # The sparse matrix backend gives the same edge list
+    sparse_edges = compute_edge_arrays(output_attributes, backend='sparse')
+    for name in ['src', 'dst', 'weight'] + EDGE_ATTRIBUTES:
+        assert sparse_edges[name].tolist() == edges[name].tolist()
+
+    # Empty input gives an empty edge list
+    assert len(compute_edge_arrays({})['src']) == 0
+    assert len(compute_edge_arrays({}, backend='sparse')['src']) == 0
+    print("compute_edge_arrays tests passed!")
+
+def test_component_arrays():
+    print("\nTesting component_arrays...")
+    G = nx.Graph()
+    G.add_nodes_from(range(8))
+    G.add_edges_from([(0, 1), (3, 4), (4, 5), (1, 6)])
+    src, dst = np.array([u for u, _ in G.edges()]), np.array([v for _, v in G.edges()])
+    component_ids, component_sizes = component_arrays(8, src, dst)
+    # Same numbering as nx.connected_components
+    expected = {node: k for k, component in enumerate(nx.connected_components(G)) for node in component}
+    assert component_ids.tolist() == [expected[node] for node in range(8)]
+    assert component_sizes.tolist() == [len(c) for c in nx.connected_components(G)] == [3, 1, 3, 1]
+    assert len(component_arrays(0, src[:0], dst[:0])[1]) == 0
+    print("component_arrays tests passed!")
+
+def test_sparsify_edges():
+    print("\nTesting sparsify_edges...")
+    # Star around node 0 with weights 3, 2, 1 plus a weight-1 edge 2-3
+    edges = {
+        'src': np.array([0, 0, 0, 2]), 'dst': np.array([1, 2, 3, 3]),
+        'weight': np.array([3, 2, 1, 1]),
+        'shared_authors': np.array([2, 0, 1, 0]), 'shared_datasets': np.array([0, 0, 0, 0]),
+        'shared_topics': np.array([1, 2, 0, 1]), 'shared_affiliations': np.array([0, 0, 0, 0]),
+        'same_location': np.array([0, 0, 0, 0]),
+    }
+    assert sparsify_edges(edges, 4, min_weight=2)['dst'].tolist() == [1, 2]
+    assert sparsify_edges(edges, 4, min_shared={'shared_authors': 1})['dst'].tolist() == [1, 3]
+
+    # Node 0 keeps only its heaviest edge, but 0-2 and 0-3 survive through nodes 2 and 3
+    top1 = sparsify_edges(edges, 4, top_k=1)
+    assert list(zip(top1['src'].tolist(), top1['dst'].tolist())) == [(0, 1), (0, 2), (0, 3)]
+    top1 = sparsify_edges(edges, 4, min_weight=2, top_k=1)
+    assert top1['dst'].tolist() == [1, 2]
+    print("sparsify_edges tests passed!")
+
+def test_compact_research_graph():
+    print("\nTesting CompactResearchGraph...")
+    data = {
+        'output_id': ['1', '2', '3', '4'],
+        'title': ['Paper 1', 'Paper 2', 'Paper 3', None],
+        'year': [2020, 2021, 2022, None],
+        'authors': [['Author A', 'Author B'], ['Author B', 'Author C'], ['Author A'], []],
+        'matched_datasets': [['dataset1'], ['dataset1', 'dataset2'], [], None],
+        'topics': [['topic1'], ['topic2'], ['topic1', 'topic2'], None],
+        'affiliations': [['affil1'], [], ['affil1'], None],
+        'location': ['loc1', 'loc1', None, None]
+    }
+    df = pd.DataFrame(data)
+    G = construct_research_graph(df)
+    C = construct_research_graph(df, compact=True)
+
+    assert C.edge_store.dtype == EDGE_DTYPE
+    assert C.number_of_nodes() == G.number_of_nodes()
+    assert C.number_of_edges() == G.number_of_edges()
+
+    # Materializing gives back the same nodes, attributes and edges
+    H = C.to_networkx()
+    assert list(H.nodes(data=True)) == list(G.nodes(data=True))
+    assert list(H.edges(data=True)) == list(G.edges(data=True))
+    assert list(C.edges(data=True)) == list(G.edges(data=True))
+
+    # Metrics run on the compact graph with both backends
+    metrics, _ = calculate_network_metrics(C)
+    assert metrics['num_edges'] == G.number_of_edges()
+    if igraph is not None:
+        metrics, C = calculate_network_metrics(C, backend='igraph')
+        assert 'community' in C.node_attributes(C.nodes()[0])
+    print("CompactResearchGraph tests passed!")
+
 def test_calculate_network_metrics():
     print("\nTesting calculate_network_metrics...")
     # Create a simple test graph
@@ -358,6 +1671,160 @@ def test_calculate_network_metrics():
     assert 'community' in G_with_communities.nodes['1']
     print("calculate_network_metrics tests passed!")
 
+def test_approximate_network_metrics():
+    print("\nTesting approximate calculate_network_metrics...")
+    G = nx.karate_club_graph()
+    for u, v in G.edges():
+        G[u][v]['weight'] = 1 + (u + v) % 3
+
+    # Using every node as a source gives the exact values
+    exact_betweenness = nx.betweenness_centrality(G, weight='weight')
+    exact_closeness = nx.closeness_centrality(G, distance='weight')
+    all_sources = sampled_betweenness_centrality(G, list(G))
+    assert all(abs(all_sources[n] - exact_betweenness[n]) < 1e-9 for n in G)
+    all_sources = sampled_closeness_centrality(G, list(G))
+    assert all(abs(all_sources[n] - exact_closeness[n]) < 1e-9 for n in G)
+
+    # Sampled run reports the number of sources and the top-k overlap with the exact run
+    metrics, _ = calculate_network_metrics(G, approximate=True, num_sources=20, validate=True, top_k=5)
+    assert metrics['approximation']['num_sources'] == 20
+    assert 0 <= metrics['approximation']['betweenness_top_k_overlap'] <= 1
+    assert 0 <= metrics['approximation']['closeness_top_k_overlap'] <= 1
+    assert set(metrics['betweenness_centrality']) == set(G)
+    assert not metrics['approximation']['exact']
+
+    # Default error bound needs more pivots than the 34 nodes: exact values instead
+    assert num_pivots(1000, 0.1, 0.1) < 1000
+    metrics, _ = calculate_network_metrics(G, approximate=True)
+    assert metrics['approximation']['exact'] and metrics['approximation']['num_sources'] == G.number_of_nodes()
+    assert all(abs(metrics['betweenness_centrality'][n] - exact_betweenness[n]) < 1e-9 for n in G)
+    print("approximate calculate_network_metrics tests passed!")
+
+def test_igraph_network_metrics():
+    print("\nTesting calculate_network_metrics with the igraph backend...")
+    if igraph is None:
+        print("igraph not installed, skipping")
+        return
+    G = nx.karate_club_graph()
+    for u, v in G.edges():
+        G[u][v]['weight'] = 1 + (u + v) % 3
+    G.add_node('isolated')
+
+    expected, _ = calculate_network_metrics(G.copy())
+    metrics, G_with_communities = calculate_network_metrics(G, backend='igraph')
+
+    # Same metrics dict shape and values as the networkx backend
+    assert set(metrics) == set(expected)
+    for name in ['degree_centrality', 'betweenness_centrality', 'closeness_centrality']:
+        assert all(abs(metrics[name][n] - expected[name][n]) < 1e-9 for n in G)
+    assert abs(metrics['average_clustering'] - expected['average_clustering']) < 1e-9
+    assert metrics['num_connected_components'] == expected['num_connected_components'] == 2
+    assert 'community' in G_with_communities.nodes[0]
+    print("igraph calculate_network_metrics tests passed!")
+
+def test_detect_communities():
+    print("\nTesting detect_communities...")
+    # Two 5-cliques joined by one edge
+    G = nx.barbell_graph(5, 0)
+    nodes, src, dst, weight = graph_to_arrays(G)
+    sweep = detect_communities(len(nodes), src, dst, weight, resolutions=[2.0, 0.01, 1.0])
+
+    assert [level['resolution'] for level in sweep['levels']] == [0.01, 1.0, 2.0]
+    level = sweep['levels'][1]
+    assert level['num_communities'] == 2
+    assert level['membership'].tolist() == [0] * 5 + [1] * 5
+    expected = nx.community.modularity(G, [set(range(5)), set(range(5, 10))])
+    assert abs(level['modularity'] - expected) < 1e-9
+    assert sweep['levels'][0]['num_communities'] == 1  # low resolution merges everything
+    assert len(sweep['parents']) == 2 and sweep['parents'][0].tolist() == [0, 0]
+    assert sweep['best'] == 1
+
+    # Seeded runs are reproducible, in a process pool too
+    again = detect_communities(len(nodes), src, dst, weight, resolutions=[0.01, 1.0, 2.0], n_jobs=2)
+    assert all((a['membership'] == b['membership']).all() for a, b in zip(sweep['levels'], again['levels']))
+
+    metrics, G = calculate_network_metrics(G, resolutions=[0.5, 1.0])
+    assert len(metrics['communities']) == 2 and 'community_sweep' in metrics
+
+    # Seeding leaves igraph's own generator (the random module) in place afterwards
+    if igraph is not None:
+        random.seed(7)
+        expected = random.random()
+        detect_communities(len(nodes), src, dst, weight, resolutions=[1.0])
+        random.seed(7)
+        igraph.Graph.Erdos_Renyi(20, 0.5)  # draws from the restored generator
+        assert random.random() != expected
+    print("detect_communities tests passed!")
+
+def test_incremental_research_graph():
+    print("\nTesting IncrementalResearchGraph...")
+    data = {
+        'output_id': ['1', '2', '3', '4'],
+        'title': ['Paper 1', 'Paper 2', 'Paper 3', 'Paper 4'],
+        'year': [2020, 2021, 2022, 2023],
+        'authors': [['Author A'], ['Author A', 'Author B'], ['Author C'], ['Author D']],
+        'matched_datasets': [['dataset1'], [], ['dataset2'], []],
+        'topics': [['topic1'], ['topic1'], [], ['topic9']],
+        'affiliations': [[], [], [], []],
+        'location': [None, None, None, None]
+    }
+    df = pd.DataFrame(data)
+
+    def same_graph(G, H):
+        assert set(G.nodes) == set(H.nodes)
+        assert {frozenset(e) for e in G.edges} == {frozenset(e) for e in H.edges}
+        for u, v, d in G.edges(data=True):
+            assert H.get_edge_data(u, v) == d
+
+    # Start from the first two outputs and insert the rest
+    updater = IncrementalResearchGraph(construct_research_graph(df.iloc[:2]))
+    assert updater.apply(df) == (2, 0)
+    same_graph(updater.G, construct_research_graph(df))
+    assert updater.num_connected_components() == 3
+
+    # Output 3 now shares Author B with output 2, output 1 is removed
+    df.at[2, 'authors'] = ['Author C', 'Author B']
+    assert updater.apply(df.iloc[1:], removed_ids=['1']) == (1, 1)
+    same_graph(updater.G, construct_research_graph(df.iloc[1:]))
+    assert updater.num_connected_components() == 2
+    assert updater.degree_centrality() == nx.degree_centrality(updater.G)
+
+    # Removing output 2 leaves output 3 on its own
+    updater.remove_output('2')
+    assert updater.num_connected_components() == nx.number_connected_components(updater.G) == 2
+    print("IncrementalResearchGraph tests passed!")
+
+def test_graph_artifact():
+    print("\nTesting save/load_graph_artifact...")
+    import tempfile
+    data = {
+        'output_id': ['1', '2', '3'],
+        'title': ['Paper 1', 'Paper 2', 'Paper 3'],
+        'year': [2020, 2021, None],
+        'authors': [['Author A', 'Author B'], ['Author B', 'Author C'], ['Author A']],
+        'matched_datasets': [['dataset1'], ['dataset1'], []],
+        'topics': [['topic1'], ['topic2'], ['topic1']],
+        'affiliations': [[], [], []],
+        'location': ['loc1', None, 'loc1']
+    }
+    G = construct_research_graph(pd.DataFrame(data))
+    metrics, G = calculate_network_metrics(G, resolutions=[0.5, 1.0])
+
+    with tempfile.TemporaryDirectory() as artifact_dir:
+        path = get_artifact_path('outputs.csv', 'abc', artifact_dir)
+        save_graph_artifact(G, metrics, path, 'abc')
+        assert load_graph_artifact(path, 'other') is None  # input changed
+        H, loaded = load_graph_artifact(path, 'abc')
+
+    assert H.nodes(data=True) == list(G.nodes(data=True))
+    assert list(H.edges(data=True)) == list(G.edges(data=True))
+    for name in SCALAR_METRICS + NODE_METRICS + ['communities']:
+        assert loaded[name] == metrics[name], name
+    for level, loaded_level in zip(metrics['community_sweep']['levels'], loaded['community_sweep']['levels']):
+        assert (level['membership'] == loaded_level['membership']).all()
+        assert level['modularity'] == loaded_level['modularity']
+    print("save/load_graph_artifact tests passed!")
+
 def test_empty_graph_handling():
     print("\nTesting empty_graph_handling...")
     # Test with empty DataFrame
@@ -413,6 +1880,32 @@ def test_calculate_network_metrics():
 
     print("calculate_network_metrics tests passed!")
 
+def test_layout_graph():
+    print("\nTesting layout_graph...")
+    # Multilevel grid repulsion is close to the exact O(n^2) sum
+    rng = np.random.default_rng(0)
+    xy = rng.normal(size=(500, 2))
+    mass = rng.integers(1, 5, size=500).astype(float)
+    delta = xy[:, None, :] - xy[None, :, :]
+    dist2 = (delta ** 2).sum(axis=2)
+    np.fill_diagonal(dist2, np.inf)
+    exact = ((2.0 * mass[:, None] * mass[None, :] / dist2)[:, :, None] * delta).sum(axis=1)
+    error = np.linalg.norm(grid_repulsion(xy, mass, 2.0) - exact, axis=1) / np.linalg.norm(exact, axis=1)
+    assert np.median(error) < 0.05
+
+    # Connected nodes end up closer than unconnected ones
+    G = nx.barbell_graph(10, 0)
+    pos = layout_graph(G)
+    assert set(pos) == set(G)
+    assert np.linalg.norm(pos[0] - pos[1]) < np.linalg.norm(pos[0] - pos[19])
+
+    # Cached positions are reused; a new node is placed and the others warm-start
+    assert all(np.allclose(layout_graph(G, pos=pos)[n], pos[n]) for n in G)
+    G.add_edge(19, 20)
+    warm = layout_graph(G, pos=pos)
+    assert set(warm) == set(G) and np.isfinite(np.array(list(warm.values()))).all()
+    print("layout_graph tests passed!")
+
 def test_visualize_graph():
     print("\nTesting visualize_graph (visual check only)...")
     # We would like to verify that it can run without errors
@@ -432,7 +1925,18 @@ def test_visualize_graph():
     for n in G.nodes():
         G.nodes[n]['title'] = f'Paper {n}'
         G.nodes[n]['year'] = 2000 + n
-    visualize_graph(G)  # Should print message about sampling
+    visualize_graph(G, max_nodes=10)  # Should print message about sampling
+
+    # Large graph rendered headless, once with lines and once as a density image
+    import tempfile
+    G = nx.random_geometric_graph(2000, 0.08, seed=1)
+    nx.set_node_attributes(G, {n: n % 5 for n in G}, 'community')
+    with tempfile.TemporaryDirectory() as output_dir:
+        visualize_graph(G, output_path=os.path.join(output_dir, 'graph.png'), pos=nx.get_node_attributes(G, 'pos'))
+        assert os.path.getsize(os.path.join(output_dir, 'graph.png')) > 0
+        visualize_graph(G, output_path=os.path.join(output_dir, 'graph.svg'), pos=nx.get_node_attributes(G, 'pos'),
+                        raster_edges=100)
+        assert os.path.getsize(os.path.join(output_dir, 'graph.svg')) > 0
     print("visualize_graph tests passed (no exceptions)!")
 
 def run_all_tests():
@@ -442,11 +1946,26 @@ def run_all_tests():
     test_clean_author_name()
     test_process_authors_field()
     test_construct_research_graph()
+    test_compute_edge_arrays()
+    test_sparsify_edges()
+    test_component_arrays()
+    test_compact_research_graph()
     test_calculate_network_metrics()
+    test_detect_communities()
+    test_incremental_research_graph()
+    test_graph_artifact()
     test_empty_graph_handling()
     test_calculate_network_metrics()
+    test_approximate_network_metrics()
+    test_igraph_network_metrics()
+    test_layout_graph()
     test_visualize_graph()
 
     print("\nAll tests passed!")
 
-run_all_tests()
\ No newline at end of file
+if __name__ == "__main__":
+    run_all_tests()
+
+    research_graph, metrics = analyze_network('unique_research_outputs.csv')
+
+    research_graph, metrics = analyze_network('unique_outputs_webscraping.csv')
\ No newline at end of file
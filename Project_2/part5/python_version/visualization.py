@@ -17,6 +17,7 @@ Datasets used:
 Dependencies listed below:
 """
 
+import os
 import pandas as pd
 import numpy as np
 import plotly.express as px
@@ -36,6 +37,11 @@ import statsmodels.formula.api as smf # for multiple regression
 import umap # for bert
 import hdbscan # for bert
 import unittest
+import sys
+
+# Part 3 owns the hand-off format (write_handoff / handoff_parquet_file)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "part3"))
+from data_processing import handoff_parquet_file
 
 """# Defining Functions"""
 
@@ -56,6 +62,21 @@ def load_data(filename):
     print(f"An unexpected error occurred: {e}")
 
 
+def load_handoff(filename):
+  """
+    Load a Part 3 hand-off file, using the typed Parquet copy if it is up to date with the csv
+    Authors come back as tuples (no literal_eval needed, still hashable for duplicate checks)
+    Args:
+    filename: Enter csv filename as str (include quotations)
+  """
+  parquet_filename = handoff_parquet_file(filename)
+  if parquet_filename is None:
+    return load_data(filename)
+  df = pd.read_parquet(parquet_filename)
+  df['authors'] = df['authors'].map(tuple)
+  return df
+
+
 def load_data_from_url(url):
     """
     Loads csv/xlsx data from a URL using pandas, requests, and BytesIO
@@ -98,9 +119,9 @@ def clean_text(text):
 """# Data Ingestion and Processing"""
 
 # unique data from API
-df=load_data('part3/unique_research_outputs.csv')
+df=load_handoff('part3/unique_research_outputs.csv')
 # unique data from webscraping
-df_webscraping =load_data('part3/unique_outputs_webscraping.csv')
+df_webscraping =load_handoff('part3/unique_outputs_webscraping.csv')
 # 2024 data compiled earlier
 data_24 =load_data_from_url("https://github.com/dingkaihua/fsrdc-external-census-projects/blob/master/ResearchOutputs.xlsx")
 
@@ -201,8 +222,8 @@ df_subset = df_subset.rename(columns={"title": "OutputTitle", "year": "OutputYea
 
 df_subset.head(n=3)
 
-# cleaning ProjectPI: removing quotes
-df_subset['ProjectPI'] = df_subset['ProjectPI'].apply(lambda x: set(name.strip("'\"") for name in ast.literal_eval(x)))
+# cleaning ProjectPI: removing quotes (authors from the Parquet hand-off are already a tuple)
+df_subset['ProjectPI'] = df_subset['ProjectPI'].apply(lambda x: set(name.strip("'\"") for name in (ast.literal_eval(x) if isinstance(x, str) else x)))
 
 # count of authors
 max_length = df_subset['ProjectPI'].apply(len).max()
@@ -268,8 +289,8 @@ df_webscraping_subset = df_webscraping_subset.rename(columns={"title": "OutputTi
                                             "location": "ProjectRDC", "abstract" : "Abstract",
                                             "cited_by_count": "CiteCount" })
 
-# cleaning ProjectPI: removing quotes
-df_webscraping_subset['ProjectPI'] = df_webscraping_subset['ProjectPI'].apply(lambda x: set(name.strip("'\"") for name in ast.literal_eval(x)))
+# cleaning ProjectPI: removing quotes (authors from the Parquet hand-off are already a tuple)
+df_webscraping_subset['ProjectPI'] = df_webscraping_subset['ProjectPI'].apply(lambda x: set(name.strip("'\"") for name in (ast.literal_eval(x) if isinstance(x, str) else x)))
 
 # count of authors
 max_length = df_webscraping_subset['ProjectPI'].apply(len).max()
@@ -672,15 +693,60 @@ def shareCommonAttribute(r1, r2):
         return True
     return False # if no common attributes are found, return False
 
-def create_graph(name_dataset):
+class ComponentTracker:
+  """
+  Union-find over graph nodes, updated while the graph edges are created
+  Gives connected component ids and sizes as arrays without building a second graph
+  """
+  def __init__(self):
+    self.index = {} # node -> position
+    self.parent = []
+    self.size = []
+
+  def add(self, node):
+    if node not in self.index:
+      self.index[node] = len(self.parent)
+      self.parent.append(len(self.parent))
+      self.size.append(1)
+    return self.index[node]
+
+  def find(self, i):
+    while self.parent[i] != i:
+      self.parent[i] = self.parent[self.parent[i]] # path halving
+      i = self.parent[i]
+    return i
+
+  def union(self, node1, node2):
+    root1, root2 = self.find(self.add(node1)), self.find(self.add(node2))
+    if root1 == root2:
+      return
+    if self.size[root1] < self.size[root2]: # attach the smaller tree under the larger one
+      root1, root2 = root2, root1
+    self.parent[root2] = root1
+    self.size[root1] += self.size[root2]
+
+  def component_ids(self):
+    """
+    Returns: array with the component id of each node in insertion order (numbered by
+    first node, like nx.connected_components) and array with the size of each component
+    """
+    roots = np.array([self.find(i) for i in range(len(self.parent))], dtype=int)
+    _, first, ids = np.unique(roots, return_index=True, return_inverse=True)
+    ids = np.argsort(np.argsort(first))[ids]
+    return ids, np.bincount(ids, minlength=len(first))
+
+def create_graph(name_dataset, components=None):
   """
   Function to create graph linking research outputs with common agency/keyword
-  Args: name of list with each research output stored  as object
+  Args: name of list with each research output stored  as object,
+  optional ComponentTracker that is updated with every link
   Returns: dict object with nodes as key and edges as values
   """
   G = {} # intialize graph as empty dictionary
   for r in name_dataset:
     G[r] = [] # empty list for values for nodes
+    if components is not None:
+      components.add(r)
   for i in range(len(name_dataset)): # start loop begining from first item
     for j in range(i + 1, len(name_dataset)): # starting from second item
       r1 = name_dataset[i] # storing the info for 1 element
@@ -688,9 +754,12 @@ def create_graph(name_dataset):
       if shareCommonAttribute(r1,r2): # identifying if they have any common agency/keyword
         G[r1].append(r2)  # adding links
         G[r2].append(r1)  # adding links
+        if components is not None:
+          components.union(r1, r2)
   return G
 
-G = create_graph(outputs)
+components = ComponentTracker()
+G = create_graph(outputs, components)
 len(G)
 
 # Check unique outputs i.e. outputs with different titles, keywords and years
@@ -700,49 +769,41 @@ for r in outputs:
 
 print(f"The dataset contains {len(unique_outputs)} unique research outputs i.e. title, year, agency, topics, keyword, author.")
 
-import networkx as nx
-import matplotlib.pyplot as plt
-
-# Step 1: Create the graph
-graph = nx.Graph()
-for node in G.keys():
-    graph.add_node(node)
-
-# Step 2: Add edges from the dictionary
-for node, neighbors in G.items():
-    for neighbor in neighbors:
-        graph.add_edge(node, neighbor)
-
-# Step 3: Find connected components
-connected_components = list(nx.connected_components(graph))
-
-# Step 3: Identify connected components
-components = list(nx.connected_components(graph))
-
-# Step 4: Create a dictionary of labels where the key is the node and the value is the component size
-labels_to_display = {}
-for component in components:
-    component_size = len(component)  # Size of the current component
-    # Choose a representative node from the component (e.g., first node)
-    representative_node = next(iter(component))
-    labels_to_display[representative_node] = str(component_size)
-
-# Step 4: Assign colors to nodes based on connected components
-node_colors = []
-for node in graph.nodes():
-    for idx, component in enumerate(connected_components):
-        if node in component:
-            node_colors.append(f"C{idx}")  # Color by component index
-
-graph.remove_edges_from(nx.selfloop_edges(graph))
-
-# Step 5: Visualize the graph with nodes colored by connected component
-plt.figure(figsize=(8, 8))
-pos = nx.spring_layout(graph)  # Positions for the nodes
-
-# Draw the graph with different colors for different components
-nx.draw(graph, pos, with_labels=False, node_size=10, node_color=node_colors, font_size=10, font_weight='bold', edge_color="gray", alpha=0.7)
-nx.draw_networkx_labels(graph, pos, labels=labels_to_display, font_size=10, font_weight='bold')
+from matplotlib.collections import LineCollection
+
+# Step 1: Component id and size of every node, from the union-find filled while creating the graph
+nodes = list(components.index)
+component_ids, component_sizes = components.component_ids()
+
+# Step 2: Create a dictionary of labels where the key is a representative node (first node) and the value is the component size
+first_nodes = np.unique(component_ids, return_index=True)[1]
+labels_to_display = {nodes[i]: str(component_sizes[component_ids[i]]) for i in first_nodes}
+
+# Step 3: Assign colors to nodes based on connected components
+node_colors = [f"C{idx}" for idx in component_ids]
+
+# Step 4: Place each component in its own grid cell with its nodes on a circle (components are cliques)
+grid_size = int(np.ceil(np.sqrt(len(component_sizes))))
+order = np.argsort(component_ids, kind='stable')
+rank = np.empty(len(nodes), dtype=int)
+rank[order] = np.arange(len(nodes)) - np.repeat(np.cumsum(component_sizes) - component_sizes, component_sizes)
+angle = 2 * np.pi * rank / component_sizes[component_ids]
+radius = 0.4 * np.sqrt(component_sizes[component_ids] / component_sizes.max())
+x = component_ids % grid_size + radius * np.cos(angle)
+y = component_ids // grid_size + radius * np.sin(angle)
+
+# Step 5: Edges from the dict adjacency, without self loops
+edges = {(components.index[u], components.index[v]) for u, neighbors in G.items() for v in neighbors
+         if components.index[u] < components.index[v]}
+
+# Step 6: Visualize the graph with nodes colored by connected component
+fig, ax = plt.subplots(figsize=(8, 8))
+ax.add_collection(LineCollection([[(x[i], y[i]), (x[j], y[j])] for i, j in edges], colors="gray", alpha=0.7, linewidths=0.5))
+ax.scatter(x, y, s=10, c=node_colors, alpha=0.7)
+for i in first_nodes:
+    ax.text(x[i], y[i], labels_to_display[nodes[i]], fontsize=10, fontweight='bold')
+ax.autoscale()
+ax.axis('off')
 
 # Title and show the plot
 plt.title("Network with Connected Components")
@@ -750,11 +811,14 @@ plt.show()
 
 # Optional: Print the connected components
 print("Connected components:")
-for idx, component in enumerate(connected_components):
+component_members = [set() for _ in component_sizes]
+for node, idx in zip(nodes, component_ids):
+    component_members[idx].add(node)
+for idx, component in enumerate(component_members):
     print(f"Component {idx + 1}: {component}")
 
-print(f"Number of nodes: {graph.number_of_nodes()}")
-print(f"Number of edges: {graph.number_of_edges()}")
+print(f"Number of nodes: {len(nodes)}")
+print(f"Number of edges: {len(edges)}")
 
 labels_to_display
 
@@ -885,5 +949,14 @@ class TestGraph(unittest.TestCase):
         expected = graph_result4
         self.assertEqual(result, expected)
 
+    def test_component_tracker(self):
+        '''Test case function for connected components: with Test Case 4 '''
+        components = ComponentTracker()
+        result = create_graph(research_outputs_test4, components)
+        self.assertEqual(result, graph_result4) # same graph as without the tracker
+        component_ids, component_sizes = components.component_ids()
+        self.assertEqual(component_ids.tolist(), [0, 1, 0])
+        self.assertEqual(component_sizes.tolist(), [2, 1])
+
 if __name__ == '__main__':
     unittest.main(argv=[''], verbosity=2, exit=False)
\ No newline at end of file